@@ -1,15 +1,100 @@
-from flask import Flask, render_template, jsonify
-import pandas as pd
+import startup
+
+from flask import Flask, copy_current_request_context, has_request_context, redirect, \
+    render_template, jsonify, request, url_for, Response, abort
+import functools
+import hashlib
+import json
 import os
+import time
+from urllib.parse import quote
+
+from assets import AssetPipeline
+from page_cache import PageCache
+from http_cache import HttpCache
+from metrics import Metrics, add_spans, collect_spans, span
+from profiler import Profiler
+from template_cache import FragmentCache, use_bytecode_cache
+from warmup import Warmer
+from work_pool import PoolBusy, WorkPool
+
+# The data layer pulls in pandas/NumPy; it is imported on the first request
+# that needs the dataset, so static pages start without paying for it
+data_store = startup.lazy_import(
+    'data_store', on_import=lambda module: warmer.attach(module.dataset_cache))
+listings = startup.lazy_import('listings')
+search = startup.lazy_import('search')
+export = startup.lazy_import('export')
+
+startup.mark('imports')
 
 app = Flask(__name__)
 
-# Helper function to safely convert values to strings
-def safe_str(value):
-    """Safely convert any value to string"""
-    if pd.isna(value) or value is None:
-        return ''
-    return str(value)
+# Inline the above-the-fold CSS and load the full stylesheet asynchronously
+app.config['INLINE_CRITICAL_CSS'] = os.environ.get('INLINE_CRITICAL_CSS') == '1'
+
+# Minified, content-hashed CSS/JS bundles served under /static/assets
+assets = AssetPipeline()
+
+# {% cache %} blocks for the SERVICE_INFO-driven markup, and precompiled
+# templates when template_cache/ exists (python template_cache.py)
+fragment_cache = FragmentCache(app)
+use_bytecode_cache(app)
+
+@app.context_processor
+def inject_assets():
+    """Make the asset helpers available to every template"""
+    return {
+        'asset_url': assets.url,
+        'inline_asset': assets.inline,
+        'inline_critical_css': app.config['INLINE_CRITICAL_CSS'],
+        'content_version': CONTENT_VERSION,
+    }
+
+# Timing spans, Server-Timing header and /metrics; registered before
+# http_cache so the reported total includes compression
+metrics = Metrics(app)
+
+# Opt-in sampling profiler (PROFILING=1, then ?_profile=1 per request)
+profiler = Profiler(app)
+
+# Compression, ETags, 304s and Cache-Control for every route. Routes not
+# listed get "public, max-age=300" (HTML) or "public, no-cache" (JSON).
+http_cache = HttpCache(app, policies={
+    'api_dataset_stats': 'no-store',
+    'metrics': 'no-store',
+    'api_listings': 'public, max-age=60',
+    'api_search': 'public, max-age=60',
+    'api_export': 'public, max-age=60',
+})
+
+# Dataset loads, index builds, page renders on a miss and listing/search
+# queries run here, so they cannot tie up every server thread; concurrent
+# requests for the same work share it, and excess work gets a fast 503
+work_pool = WorkPool(max_workers=int(os.environ.get('DATA_WORKERS', '2')),
+                     max_pending=int(os.environ.get('DATA_QUEUE', '16')),
+                     timeout=float(os.environ.get('DATA_TIMEOUT', '30')))
+
+def offload(key, func, *args):
+    """Run ``func(*args)`` on the work pool, coalesced by ``key``, and wait for it"""
+    call = functools.partial(func, *args)
+    if has_request_context():
+        call = profiler.follow(copy_current_request_context(call))
+    result, spans = work_pool.run(key, collect_spans(call))
+    add_spans(spans)
+    return result
+
+@app.errorhandler(PoolBusy)
+def pool_busy(error):
+    """Work pool saturated or too slow: ask the client to retry"""
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': str(error)})
+    else:
+        response = app.make_response(render_template('error.html', message=str(error)))
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 # Top 10 LLC services (based on common ones)
 TOP_LLC_SERVICES = [
@@ -320,28 +405,68 @@ SERVICE_INFO = {
     }
 }
 
-# Load CSV data
-def load_csv_data():
-    """Load and return CSV data"""
-    # Try multiple possible paths for different environments
-    possible_paths = [
-        "LLC Data.csv",  # For Vercel deployment
-        r"C:\rozy\LLC Data.csv",  # For local development
-        "./LLC Data.csv",  # Alternative local path
+# Hash of the static service content and asset bundles; part of every
+# cached page's version
+CONTENT_VERSION = hashlib.sha1(
+    json.dumps([TOP_LLC_SERVICES, SERVICE_INFO, assets.version], sort_keys=True).encode('utf-8')
+).hexdigest()[:12]
+
+def page_version():
+    """Version of everything the data-driven pages are rendered from"""
+    return f'{get_dataset().version}-{CONTENT_VERSION}'
+
+# Listing cards per page: state and city pages render the first page and
+# load the rest as HTML fragments
+LISTING_PAGE_SIZE = int(os.environ.get('LISTING_PAGE_SIZE', '24'))
+
+# Cities linked from a state page (and from a city page to its neighbours)
+CITY_LINKS = 24
+
+def refresh_page(key, render):
+    """Re-render a page in the background while its stale copy is served"""
+    try:
+        # Same key and result shape as offload(), so a request can share this render
+        work_pool.submit(('page',) + key, collect_spans(copy_current_request_context(render)))
+    except PoolBusy:
+        pass  # keep serving the stale copy; a later request retries
+
+# Rendered service, service/state and service/state/city pages, dropped whenever page_version() changes;
+# misses are rendered on the work pool, and for a while after a change the
+# previous rendering is served while the new one renders
+page_cache = PageCache(page_version, render=lambda key, render: offload(('page',) + key, render),
+                       refresh=refresh_page if work_pool.max_workers else None)
+
+def warm_indexes():
+    """Indexes built on each reloaded dataset generation before it is served"""
+    # The search index is the slowest to build and only /api/search needs it,
+    # so it stays lazy
+    return [
+        ('state_stats', data_store.StateStats),
+        ('cities', data_store.CityIndex),
+        ('listings', listings.ListingIndex),
     ]
-    
-    for csv_path in possible_paths:
-        if os.path.exists(csv_path):
-            try:
-                df = pd.read_csv(csv_path)
-                print(f"Successfully loaded CSV from: {csv_path}")
-                return df
-            except Exception as e:
-                print(f"Error loading CSV from {csv_path}: {e}")
-                continue
-    
-    print("CSV file not found in any of the expected locations")
-    return pd.DataFrame()
+
+def warm_fallback(dataset):
+    """Pages to warm before hits are recorded: service pages, then the busiest states"""
+    urls = [url_for('service_page', service_name=name) for name in TOP_LLC_SERVICES]
+    states = sorted(dataset.aggregates.states, key=lambda item: -item['service_count'])
+    for item in states:
+        for name in TOP_LLC_SERVICES:
+            urls.append(url_for('service_state_page', service_name=name, state=item['state']))
+    return urls
+
+# Counts page hits and, after every dataset load, builds the indexes and
+# renders the most requested pages (attached when data_store is imported)
+warmer = Warmer(app, page_cache,
+                endpoints=('service_page', 'service_state_page', 'service_city_page'),
+                indexes=warm_indexes, fallback=warm_fallback)
+
+def get_dataset():
+    """Current Dataset (imports the data layer on first use; loads run on the work pool)"""
+    dataset = data_store.dataset_cache.current()
+    if dataset is None:
+        dataset = offload('dataset', data_store.get_dataset)
+    return dataset
 
 @app.route('/')
 def index():
@@ -351,61 +476,141 @@ def index():
                          service_info=SERVICE_INFO)
 
 @app.route('/service/<service_name>')
+@page_cache.cached
 def service_page(service_name):
     """Individual service page showing states with available services"""
-    df = load_csv_data()
+    dataset = get_dataset()
     
-    if df.empty:
+    if dataset.empty:
         return render_template('service.html', 
                              service_name=service_name,
                              states=[],
                              service_info=SERVICE_INFO.get(service_name, {}))
     
-    # Get all unique states from the CSV
-    states = df['state'].dropna().unique().tolist()
-    states.sort()
+    # Get all unique states from the CSV (prebuilt when the dataset loads)
+    states = dataset.states
     
-    # For each state, get the first 50 services to display
-    state_services = {}
-    for state in states:
-        state_data = df[df['state'].astype(str).str.contains(state, case=False, na=False)]
-        state_services[state] = state_data.head(50).to_dict('records')
+    # Each state's card: row count, first listing types and busiest cities
+    # (read from the catalog when partitioned, so no partition is loaded)
+    state_previews = {state: dataset.state_preview(state) for state in states}
     
     return render_template('service.html', 
                          service_name=service_name,
                          states=states,
-                         state_services=state_services,
+                         state_previews=state_previews,
                          service_info=SERVICE_INFO.get(service_name, {}))
 
+def canonical_place_url(view):
+    """Permanently redirect state/city aliases ("TX", "austin ") to the canonical URL"""
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        dataset = get_dataset()
+        canonical = dict(kwargs)
+        state = dataset.canonical_state(kwargs['state'])
+        if state is not None:
+            canonical['state'] = state
+            if 'city' in kwargs:
+                canonical['city'] = dataset.canonical_city(state, kwargs['city']) or kwargs['city']
+        if canonical != kwargs:
+            url = url_for(request.endpoint, **canonical)
+            if request.query_string:
+                # Passed through as sent: repeated keys and keys named like route arguments survive
+                url += '?' + request.query_string.decode('latin-1')
+            return redirect(url, 301)
+        return view(**kwargs)
+    return wrapper
+
 @app.route('/service/<service_name>/<state>')
+@canonical_place_url
+@page_cache.cached
 def service_state_page(service_name, state):
     """State-specific service page showing local business services"""
-    df = load_csv_data()
+    dataset = get_dataset()
     
-    if df.empty:
+    if dataset.empty:
         return render_template('service_state.html', 
                              service_name=service_name,
                              state=state,
                              llc_services=[],
+                             state_stats=None,
+                             cities=[],
                              service_info=SERVICE_INFO.get(service_name, {}))
     
-    # Filter by state (case-insensitive)
-    state_data = df[df['state'].astype(str).str.contains(state, case=False, na=False)]
+    # First page of the state's listings; records come from the presentation
+    # view with NaN already mapped to '', later pages load as fragments
+    llc_services, next_url = listing_page(dataset, service_name, state, None, 1)
     
-    # Limit to 50 services per state
-    llc_services = state_data.head(50).to_dict('records')
-    
-    # Convert all values to strings safely
-    for service in llc_services:
-        for key, value in service.items():
-            service[key] = safe_str(value)
+    # Summary panel figures cover every row in the state, not just the page shown
+    state_stats = dataset.state_stats(state)
     
     return render_template('service_state.html', 
                          service_name=service_name,
                          state=state,
                          llc_services=llc_services,
+                         next_url=next_url,
+                         state_stats=state_stats,
+                         cities=dataset.cities(state)[:CITY_LINKS],
                          service_info=SERVICE_INFO.get(service_name, {}))
 
+@app.route('/service/<service_name>/<state>/<city>')
+@canonical_place_url
+@page_cache.cached
+def service_city_page(service_name, state, city):
+    """City-level service page under a state page"""
+    dataset = get_dataset()
+    
+    # City totals come from the same index as the state page's city links
+    cities = dataset.cities(state)
+    total = next((item['count'] for item in cities
+                  if item['city'] == city), 0)
+    if not total:
+        abort(404)
+    llc_services, next_url = listing_page(dataset, service_name, state, city, 1)
+    
+    return render_template('service_city.html',
+                         service_name=service_name,
+                         state=state,
+                         city=city,
+                         llc_services=llc_services,
+                         next_url=next_url,
+                         total=total,
+                         other_cities=[item for item in cities[:CITY_LINKS + 1]
+                                       if item['city'] != city][:CITY_LINKS],
+                         service_info=SERVICE_INFO.get(service_name, {}))
+
+def listing_page(dataset, service_name, state, city, page):
+    """(records, URL of the next fragment or None) for one page of a state or city listing"""
+    offset = (page - 1) * LISTING_PAGE_SIZE
+    # One extra row tells whether another page follows
+    if city is None:
+        records = dataset.state_records(state, limit=LISTING_PAGE_SIZE + 1, offset=offset)
+    else:
+        records = dataset.city_records(state, city, limit=LISTING_PAGE_SIZE + 1, offset=offset)
+    next_url = None
+    if len(records) > LISTING_PAGE_SIZE:
+        records = records[:LISTING_PAGE_SIZE]
+        args = {'city': city} if city is not None else {}
+        next_url = url_for('listing_fragment', service_name=service_name, state=state,
+                           page=page + 1, **args)
+    return records, next_url
+
+@app.route('/fragments/service/<service_name>/<state>/page/<int:page>')
+@app.route('/fragments/service/<service_name>/<state>/<city>/page/<int:page>')
+@canonical_place_url
+@page_cache.cached
+def listing_fragment(service_name, state, page, city=None):
+    """One page of listing cards for a state or city page's "Load more" button"""
+    if page < 1:
+        abort(404)
+    llc_services, next_url = listing_page(get_dataset(), service_name, state, city, page)
+    if not llc_services:
+        abort(404)
+    return render_template('_listing_page.html',
+                         service_name=service_name,
+                         state=state,
+                         llc_services=llc_services,
+                         next_url=next_url)
+
 @app.route('/top10-llc-services')
 def top10_llc_services():
     """Top 10 LLC Services page with detailed reviews"""
@@ -433,6 +638,19 @@ def terms_and_conditions():
     """Terms and Conditions page"""
     return render_template('terms_and_conditions.html')
 
+def conditional_jsonify(data, etag):
+    """jsonify ``data`` with a strong ETag, answering 304 when it matches"""
+    response = jsonify(data)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/static/assets/<filename>')
+def asset(filename):
+    """Fingerprinted CSS/JS bundle with far-future immutable caching"""
+    return assets.response(filename)
+
 # API endpoints
 @app.route('/api/services')
 def api_services():
@@ -442,76 +660,171 @@ def api_services():
 @app.route('/api/service/<service_name>/states')
 def api_service_states(service_name):
     """API endpoint to get states for a specific service"""
-    df = load_csv_data()
-    
-    if df.empty:
-        return jsonify([])
+    dataset = get_dataset()
     
     # Get all unique states from the entire DataFrame
-    states = df['state'].dropna().unique().tolist()
-    states.sort()
-    
-    return jsonify(states)
+    return conditional_jsonify(dataset.states, f'{dataset.version}-states')
+
+@app.route('/api/dataset-stats')
+def api_dataset_stats():
+    """API endpoint to get dataset, page, compression and work pool counters"""
+    stats = data_store.dataset_cache.stats()
+    stats['startup'] = startup.report()
+    stats['page_cache'] = page_cache.stats()
+    stats['compression'] = http_cache.stats()
+    stats['work_pool'] = work_pool.stats()
+    stats['warmup'] = warmer.stats()
+    stats['fragment_cache'] = fragment_cache.stats()
+    return jsonify(stats)
 
 @app.route('/api/states')
 def api_states():
     """API endpoint to get all states with service counts"""
-    df = load_csv_data()
+    dataset = get_dataset()
     
-    if df.empty:
-        return jsonify([])
-    
-    # Get state counts
-    state_counts = df['state'].value_counts().to_dict()
-    
-    # Format response
-    states_data = []
-    for state, count in state_counts.items():
-        if pd.notna(state):
-            states_data.append({
-                'state': state,
-                'service_count': int(count)
-            })
-    
-    # Sort by state name
-    states_data.sort(key=lambda x: x['state'])
+    # State counts are precomputed when the dataset loads, sorted by state name
+    return conditional_jsonify(dataset.aggregates.states, f'{dataset.version}-state-counts')
+
+@app.route('/api/cities/<state>')
+def api_cities(state):
+    """API endpoint to get a state's cities with business counts"""
+    dataset = get_dataset()
+    canonical = dataset.canonical_state(state)
+    if canonical is None:
+        return jsonify({'error': f"unknown state '{state}'"}), 404
     
-    return jsonify(states_data)
+    cities = offload(('api_cities', dataset.version, canonical), dataset.cities, canonical)
+    return conditional_jsonify({'state': canonical, 'cities': cities},
+                               f"{dataset.version}-cities-{quote(canonical)}")
 
 @app.route('/api/data-summary')
 def api_data_summary():
     """API endpoint to get data summary"""
-    df = load_csv_data()
+    dataset = get_dataset()
     
-    if df.empty:
-        return jsonify({
-            'total_records': 0,
-            'unique_states': 0,
-            'unique_cities': 0,
-            'top_states': [],
-            'top_cities': []
-        })
+    # Summary statistics are precomputed when the dataset loads
+    return conditional_jsonify(dataset.aggregates.summary(), f'{dataset.version}-summary')
+
+def query_key(endpoint, dataset):
+    """Work pool key for a query endpoint: identical requests on one generation share a computation"""
+    return (endpoint, dataset.version, tuple(sorted(request.args.items(multi=True))))
+
+def listing_filters(args):
+    """Filter and sort arguments shared by the listing and export endpoints"""
+    min_rating = args.get('min_rating')
+    try:
+        min_rating = float(min_rating) if min_rating else None
+    except ValueError:
+        raise listings.ListingQueryError("min_rating must be a number")
+    return {
+        'state': args.get('state'),
+        'city': args.get('city'),
+        'category': args.get('category'),
+        'type': args.get('type'),
+        'min_rating': min_rating,
+        'sort': args.get('sort', 'default'),
+    }
+
+def listings_payload(dataset, args):
+    """Filter, sort and page the listings for ``args`` (raises ListingQueryError)"""
+    listing_index = dataset.derived('listings', listings.ListingIndex)
     
-    # Calculate summary statistics
-    total_records = len(df)
-    unique_states = df['state'].nunique()
-    unique_cities = df['city'].nunique() if 'city' in df.columns else 0
+    filters = listing_filters(args)
+    try:
+        limit = int(args.get('limit', listings.DEFAULT_LIMIT))
+    except ValueError:
+        raise listings.ListingQueryError("limit must be an integer")
     
-    # Top states by service count
-    top_states = df['state'].value_counts().head(10).to_dict()
+    with span('filter'):
+        positions, next_cursor, total = listing_index.query(
+            cursor=args.get('cursor'), limit=limit, **filters)
     
-    # Top cities by service count (if city column exists)
-    top_cities = []
-    if 'city' in df.columns:
-        top_cities = df['city'].value_counts().head(10).to_dict()
+    return {
+        'results': listing_index.records(positions),
+        'total': total,
+        'next_cursor': next_cursor
+    }
+
+@app.route('/api/listings')
+def api_listings():
+    """API endpoint to list businesses with filters, sorting and cursor pagination"""
+    dataset = get_dataset()
+    try:
+        payload = offload(query_key('api_listings', dataset), listings_payload, dataset,
+                          request.args)
+    except listings.ListingQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(payload)
+
+@app.route('/api/export/<fmt>')
+def api_export(fmt):
+    """API endpoint streaming every matching listing as CSV or NDJSON"""
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(export.FORMATS)}"}), 404
+    dataset = get_dataset()
+    # The index is built on the pool; rows are then encoded chunk by chunk
+    # as the client reads them, so no result set is ever held in full
+    listing_index = offload(('listings', dataset.version), dataset.derived, 'listings',
+                            listings.ListingIndex)
+    try:
+        chunks = listing_index.iter_positions(chunk=export.CHUNK_ROWS,
+                                              **listing_filters(request.args))
+    except listings.ListingQueryError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'total_records': total_records,
-        'unique_states': unique_states,
-        'unique_cities': unique_cities,
-        'top_states': top_states,
-        'top_cities': top_cities
-    })
+    mimetype, extension = export.FORMATS[fmt]
+    body = export.generate(dataset.df, chunks, fmt)
+    use_gzip = request.accept_encodings['gzip'] > 0
+    if use_gzip:
+        body = export.gzip_stream(body)
+    response = Response(body, mimetype=mimetype)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename=listings.{extension}'
+    return response
+
+@app.route('/api/search')
+def api_search():
+    """API endpoint for full-text search over business listings"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': "missing query parameter 'q'"}), 400
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': "limit must be an integer"}), 400
+    prefix = request.args.get('prefix', '1') != '0'
+    
+    dataset = get_dataset()
+    return jsonify(offload(query_key('api_search', dataset), search_payload, dataset, query,
+                           limit, prefix))
+
+def search_payload(dataset, query, limit, prefix):
+    """Ranked search results for ``query``"""
+    search_index = dataset.derived('search', search.build_search_index)
+    started = time.perf_counter()
+    with span('search'):
+        positions, scores, partial = search_index.search(query, limit=limit, prefix=prefix)
+    took_ms = (time.perf_counter() - started) * 1000
+    
+    results = listings.json_records(dataset.df, positions)
+    for result, score in zip(results, scores.tolist()):
+        result['score'] = round(score, 4)
+    
+    return {
+        'query': query,
+        'results': results,
+        'partial': partial,
+        'took_ms': round(took_ms, 2)
+    }
+
+# Long-running servers can pay the data load up front instead of on the
+# first request (serverless deployments should leave this unset)
+if os.environ.get('PRELOAD_DATA') == '1':
+    get_dataset()
+
+startup.mark('ready')
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
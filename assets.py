@@ -0,0 +1,133 @@
+"""
+Fingerprinted static assets for the site stylesheet and script.
+
+The sources live in ``static/css`` and ``static/js``. At startup each
+bundle is concatenated, minified and hashed, then served from memory at
+``/static/assets/<name>.<hash>.<ext>`` with an immutable one-year
+Cache-Control header. Templates resolve the hashed URL with
+``asset_url('site.css')``, so a changed file gets a new URL and browsers
+never need to revalidate the old one.
+
+``critical.css`` holds the above-the-fold rules (variables, reset, navbar,
+layout, typography). With ``INLINE_CRITICAL_CSS`` enabled, base.html
+inlines it and loads the full bundle without blocking rendering.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+
+from flask import Response, abort, request, url_for
+from markupsafe import Markup
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Bundle name -> source files under static/, concatenated in order
+BUNDLES = {
+    'critical.css': ['css/critical.css'],
+    'site.css': ['css/critical.css', 'css/site.css'],
+    'site.js': ['js/site.js'],
+}
+
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+}
+
+# Hashed URLs never change content, so caches may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace from a stylesheet"""
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _CSS_SPACE_RE.sub(' ', css)
+    css = _CSS_PUNCT_RE.sub(r'\1', css)
+    # "prop: value" -> "prop:value"; a space *before* ':' may be a descendant selector
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Drop comment-only lines, indentation and blank lines (keeps newlines for ASI)"""
+    lines = []
+    for line in js.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+class Asset:
+    """One built bundle"""
+
+    def __init__(self, name, content):
+        base, ext = os.path.splitext(name)
+        self.name = name
+        self.content = content.encode('utf-8')
+        self.digest = hashlib.sha1(self.content).hexdigest()[:12]
+        self.filename = f'{base}.{self.digest}{ext}'
+        self.mimetype = MIMETYPES.get(ext, 'application/octet-stream')
+        self.gzip_content = gzip.compress(self.content, compresslevel=9)
+
+
+class AssetPipeline:
+    """Builds the bundles once and resolves / serves their hashed names"""
+
+    def __init__(self, static_dir=STATIC_DIR, bundles=None):
+        self.static_dir = static_dir
+        self.bundles = bundles or BUNDLES
+        self.assets = {}
+        self.by_filename = {}
+        self.build()
+
+    def build(self):
+        for name, sources in self.bundles.items():
+            parts = []
+            for source in sources:
+                with open(os.path.join(self.static_dir, source), encoding='utf-8') as f:
+                    parts.append(f.read())
+            text = '\n'.join(parts)
+            if name.endswith('.css'):
+                text = minify_css(text)
+            elif name.endswith('.js'):
+                text = minify_js(text)
+            asset = Asset(name, text)
+            self.assets[name] = asset
+            self.by_filename[asset.filename] = asset
+
+    @property
+    def version(self):
+        """Combined hash of every bundle"""
+        return hashlib.sha1(''.join(sorted(a.digest for a in self.assets.values()))
+                            .encode('ascii')).hexdigest()[:12]
+
+    def url(self, name):
+        """Hashed URL for bundle ``name``"""
+        return url_for('asset', filename=self.assets[name].filename)
+
+    def inline(self, name):
+        """Minified contents of bundle ``name`` for inlining in a template"""
+        return Markup(self.assets[name].content.decode('utf-8'))
+
+    def response(self, filename):
+        """Serve a hashed asset with immutable caching (404 for unknown names)"""
+        asset = self.by_filename.get(filename)
+        if asset is None:
+            abort(404)
+        use_gzip = 'gzip' in request.accept_encodings
+        response = Response(asset.gzip_content if use_gzip else asset.content,
+                            mimetype=asset.mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.set_etag(asset.digest + ('-gzip' if use_gzip else ''))
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load-test suite for the routes in app.py.
+
+    python benchmark.py [--rows 100000] [--requests 200] [--concurrency 8]
+                        [--no-server] [--out results.json] [--compare base.json]
+
+Generates (or reuses) a synthetic "LLC Data.csv" with ``--rows`` rows,
+points the app at it and drives one URL per route:
+
+- in process, through the Flask test client: p50/p95/p99 latency,
+  throughput, and allocated memory per request (``tracemalloc``);
+- over HTTP, against a threaded Werkzeug WSGI server with
+  ``--concurrency`` client threads: latency percentiles and throughput.
+
+The dataset load time and the process's peak RSS are recorded too.
+Results are written as JSON (``--out``, default
+``.benchmarks/<commit>-<rows>.json``); ``--compare`` prints the p95
+change per route against an earlier run and exits non-zero when any
+route got slower than ``--threshold`` percent.
+
+Synthetic data follows real skew: states are weighted by population and
+cities within a state follow a Zipf distribution, so a few big cities
+hold most listings. A small share of state values have stray case and
+whitespace, as in the real export.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATA_DIR = '.benchmarks'
+GENERATE_CHUNK = 500_000
+
+# State -> population in millions (2020 census, rounded)
+STATE_WEIGHTS = {
+    'California': 39.5, 'Texas': 29.1, 'Florida': 21.5, 'New York': 20.2,
+    'Pennsylvania': 13.0, 'Illinois': 12.8, 'Ohio': 11.8, 'Georgia': 10.7,
+    'North Carolina': 10.4, 'Michigan': 10.1, 'New Jersey': 9.3, 'Virginia': 8.6,
+    'Washington': 7.7, 'Arizona': 7.2, 'Massachusetts': 7.0, 'Tennessee': 6.9,
+    'Indiana': 6.8, 'Maryland': 6.2, 'Missouri': 6.2, 'Wisconsin': 5.9,
+    'Colorado': 5.8, 'Minnesota': 5.7, 'South Carolina': 5.1, 'Alabama': 5.0,
+    'Louisiana': 4.7, 'Kentucky': 4.5, 'Oregon': 4.2, 'Oklahoma': 4.0,
+    'Connecticut': 3.6, 'Utah': 3.3, 'Iowa': 3.2, 'Nevada': 3.1, 'Arkansas': 3.0,
+    'Mississippi': 3.0, 'Kansas': 2.9, 'New Mexico': 2.1, 'Nebraska': 2.0,
+    'Idaho': 1.8, 'West Virginia': 1.8, 'Hawaii': 1.5, 'New Hampshire': 1.4,
+    'Maine': 1.4, 'Rhode Island': 1.1, 'Montana': 1.1, 'Delaware': 1.0,
+    'South Dakota': 0.9, 'North Dakota': 0.8, 'Alaska': 0.7,
+    'District of Columbia': 0.7, 'Vermont': 0.6, 'Wyoming': 0.6,
+}
+
+CITY_NAMES = [
+    'Springfield', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Fairview',
+    'Salem', 'Madison', 'Georgetown', 'Arlington', 'Ashland', 'Dover', 'Oxford',
+    'Jackson', 'Burlington', 'Manchester', 'Milton', 'Newport', 'Auburn',
+    'Dayton', 'Lexington', 'Milford', 'Riverside', 'Cleveland', 'Hudson',
+    'Kingston', 'Marion', 'Winchester', 'Centerville', 'Mount Vernon',
+]
+CITY_SUFFIXES = ['', ' Heights', ' Springs', ' Park']
+CITIES_PER_STATE = len(CITY_NAMES) * len(CITY_SUFFIXES)
+CITY_ZIPF = 1.3
+
+CATEGORIES = ['Lawyer', 'Accountant', 'Business consultant', 'Registered agent',
+              'Tax preparation service', 'Notary public', 'Bookkeeping service']
+TYPES = ['Office', 'Service', 'Agency', 'Firm']
+NAME_WORDS = ['Capital', 'Summit', 'Liberty', 'Pioneer', 'Keystone', 'Harbor',
+              'Eagle', 'Premier', 'Heritage', 'Frontier', 'Apex', 'Beacon']
+
+# Requests for the allocation measurement (tracemalloc slows everything down)
+ALLOC_SAMPLES = 20
+
+
+def generate_csv(path, rows, seed=0):
+    """Write a synthetic "LLC Data.csv" with ``rows`` rows to ``path``"""
+    rng = np.random.default_rng(seed)
+    states = np.array(list(STATE_WEIGHTS))
+    weights = np.array(list(STATE_WEIGHTS.values()))
+    weights = weights / weights.sum()
+    cities = np.array([name + suffix for suffix in CITY_SUFFIXES for name in CITY_NAMES])
+    categories = np.array(CATEGORIES)
+    words = np.array(NAME_WORDS)
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, rows, GENERATE_CHUNK):
+            n = min(GENERATE_CHUNK, rows - start)
+            ids = np.arange(start, start + n)
+            state = states[rng.choice(len(states), n, p=weights)]
+            # ~3% of rows carry the state with stray case/whitespace
+            messy = rng.random(n) < 0.03
+            state = state.astype(object)
+            state[messy] = [value.lower() + ' ' for value in state[messy]]
+            city_rank = np.minimum(rng.zipf(CITY_ZIPF, n), CITIES_PER_STATE) - 1
+            category = categories[rng.integers(0, len(categories), n)]
+            rating = np.round(np.clip(rng.normal(4.3, 0.6, n), 1, 5), 1)
+            rating[rng.random(n) < 0.15] = np.nan
+            reviews = np.floor(rng.lognormal(2.5, 1.4, n))
+            reviews[np.isnan(rating)] = np.nan
+
+            frame = pd.DataFrame({
+                'name': [f'{w} {c} {i}' for w, c, i in
+                         zip(words[ids % len(words)], category, ids)],
+                'state': state,
+                'city': cities[city_rank],
+                'phone': [f'(555) {i // 10000 % 1000:03d}-{i % 10000:04d}' for i in ids],
+                'full_address': [f'{i % 9000 + 100} Main St' for i in ids],
+                'rating': rating,
+                'reviews': reviews,
+                'site': [f'https://example{i}.com' if i % 3 else '' for i in ids],
+                'category': category,
+                'type': np.array(TYPES)[ids % len(TYPES)],
+                'description': [f'{c} serving local businesses since {1980 + i % 40}'
+                                for c, i in zip(category, ids)],
+                'working_hours': 'Mon-Fri 9AM-5PM',
+                'logo': '',
+            })
+            frame.to_csv(f, index=False, header=start == 0, float_format='%g')
+    return path
+
+
+def dataset_path(data_dir, rows, seed):
+    """Generated CSV for (rows, seed), created on first use"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'LLC Data-{rows}-{seed}.csv')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        generate_csv(path, rows, seed)
+        print(f"Generated {rows} rows into {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def benchmark_urls(app_module, dataset):
+    """One representative URL per route, plus the main query variants"""
+    from flask import url_for
+
+    # The busiest state and city, i.e. the most expensive pages to render
+    state = next(iter(dataset.aggregates.top_states), 'Texas')
+    city = next(iter(dataset.aggregates.top_cities), 'Austin')
+    state_cities = dataset.cities(state)
+    values = {
+        'service_name': app_module.TOP_LLC_SERVICES[0],
+        'state': state,
+        'city': state_cities[0]['city'] if state_cities else city,
+        # First "Load more" fragment after the page itself
+        'page': 2,
+        'fmt': 'csv',
+        'filename': app_module.assets.assets['site.css'].filename,
+    }
+    urls = []
+    app = app_module.app
+    with app.test_request_context():
+        for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+            if rule.endpoint == 'static' or 'GET' not in rule.methods:
+                continue
+            missing = [name for name in rule.arguments if name not in values]
+            if missing:
+                # A new route must get a sample value, not silently go unmeasured
+                raise ValueError(f"No sample value for {', '.join(missing)} in {rule.rule}")
+            url = url_for(rule.endpoint, **{name: values[name] for name in rule.arguments})
+            if rule.endpoint == 'api_search':
+                urls.append(url_for(rule.endpoint, q=city.split()[0]))
+                urls.append(url_for(rule.endpoint, q=city[:3].lower()))
+            elif rule.endpoint == 'api_listings':
+                urls.append(url)
+                urls.append(url_for(rule.endpoint, state=state, sort='rating', limit=50))
+                urls.append(url_for(rule.endpoint, city=city, min_rating=4))
+            elif rule.endpoint == 'api_export':
+                # One city's rows: a full export per request would dominate the run
+                urls.append(url_for(rule.endpoint, fmt='csv', state=state, city=values['city']))
+                urls.append(url_for(rule.endpoint, fmt='ndjson', state=state, city=values['city']))
+            else:
+                urls.append(url)
+    return urls
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean/max of ``samples`` (seconds) in milliseconds"""
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def run_client(app, urls, requests, warmup=3):
+    """Drive ``urls`` through the Flask test client (buffered, so streamed bodies count)"""
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    results = {}
+    for url in urls:
+        for _ in range(warmup):
+            status = client.get(url, headers=headers, buffered=True).status_code
+        timings = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            client.get(url, headers=headers, buffered=True)
+            timings.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        allocated = []
+        for _ in range(ALLOC_SAMPLES):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            client.get(url, headers=headers, buffered=True)
+            allocated.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+
+        result = percentiles(timings)
+        result.update({
+            'status': status,
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 1),
+            'alloc_peak_kb': round(float(np.median(allocated)) / 1024, 1),
+        })
+        results[url] = result
+        print(f"  client {url}: p50 {result['p50_ms']}ms p95 {result['p95_ms']}ms "
+              f"{result['throughput_rps']} req/s, {result['alloc_peak_kb']} KB")
+    return results
+
+
+def run_server(app, urls, requests, concurrency):
+    """Drive ``urls`` over HTTP against a threaded Werkzeug server"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+
+    def fetch(url):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        started = time.perf_counter()
+        connection.request('GET', url, headers={'Accept-Encoding': 'gzip'})
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return time.perf_counter() - started, response.status
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for url in urls:
+                list(pool.map(fetch, [url] * concurrency))
+                started = time.perf_counter()
+                outcomes = list(pool.map(fetch, [url] * requests))
+                elapsed = time.perf_counter() - started
+                result = percentiles([seconds for seconds, _ in outcomes])
+                result.update({
+                    'errors': sum(1 for _, status in outcomes if status >= 500),
+                    'requests': requests,
+                    'concurrency': concurrency,
+                    'throughput_rps': round(requests / elapsed, 1),
+                })
+                results[url] = result
+                print(f"  server {url}: p50 {result['p50_ms']}ms p95 {result['p95_ms']}ms "
+                      f"{result['throughput_rps']} req/s")
+    finally:
+        server.shutdown()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True,
+                              capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(rows, requests, concurrency, server=True, data_dir=DEFAULT_DATA_DIR,
+        seed=0, csv_path=None):
+    """Run the suite and return the results dict"""
+    csv_path = csv_path or dataset_path(data_dir, rows, seed)
+
+    import app as app_module
+    from data_store import dataset_cache
+    from ingest import peak_rss_mb
+
+    dataset_cache.paths = [csv_path]
+    dataset_cache.clear()
+    app_module.page_cache.clear()
+    started = time.perf_counter()
+    dataset = app_module.get_dataset()
+    load_seconds = time.perf_counter() - started
+    print(f"Loaded {len(dataset.df)} rows in {load_seconds:.2f}s")
+
+    urls = benchmark_urls(app_module, dataset)
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': len(dataset.df),
+            'seed': seed,
+            'requests': requests,
+            'concurrency': concurrency,
+        },
+        'load': {
+            'seconds': round(load_seconds, 3),
+            'source': dataset.source,
+        },
+        'client': run_client(app_module.app, urls, requests),
+    }
+    if server:
+        results['server'] = run_server(app_module.app, urls, requests, concurrency)
+    results['load']['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Print p95 changes per route; returns the URLs slower than ``threshold`` percent"""
+    regressions = []
+    for mode in ('client', 'server'):
+        old_mode, new_mode = baseline.get(mode, {}), current.get(mode, {})
+        for url, new in new_mode.items():
+            old = old_mode.get(url)
+            if old is None or not old['p95_ms']:
+                continue
+            change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((mode, url))
+            print(f"{mode:>6} {url}: p95 {old['p95_ms']}ms -> {new['p95_ms']}ms "
+                  f"({change:+.0f}%){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every route of the app")
+    parser.add_argument('--rows', type=int, default=100_000,
+                        help="synthetic dataset size (10k to 10M)")
+    parser.add_argument('--csv', help="benchmark an existing CSV instead of generating one")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help="timed requests per URL")
+    parser.add_argument('--concurrency', type=int, default=8, help="HTTP client threads")
+    parser.add_argument('--no-server', action='store_true', help="skip the HTTP load test")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--out', help="results file (default: <data-dir>/<commit>-<rows>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="p95 slowdown in percent that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.requests, args.concurrency, server=not args.no_server,
+                  data_dir=args.data_dir, seed=args.seed, csv_path=args.csv)
+    out = args.out or os.path.join(
+        args.data_dir, f"{results['meta']['commit']}-{results['meta']['rows']}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print(f"Wrote {out} (peak RSS {results['load']['peak_rss_mb']} MB)")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
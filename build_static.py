@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Pre-generate every page and API response of the app as static files.
+
+    python build_static.py [--out dist] [--jobs N] [--force]
+
+Every rule in ``app.url_map`` is expanded with the known argument values
+(``service_name`` from TOP_LLC_SERVICES, ``state`` from the dataset,
+``city`` from each state's busiest cities, the ones its state page links, and
+``page`` for every "Load more" fragment after a listing's first page) and
+rendered through the Flask test client. HTML goes to ``<url>/index.html``,
+JSON to ``<url>.json`` and the fingerprinted CSS/JS bundles to their own
+path, so the output directory can be served from a CDN without running
+Python.
+
+``manifest.json`` records a fingerprint of each page's inputs: the
+templates, the service entry, and the state, city or page slice (or the dataset version
+for pages that aggregate all states). On the next build only pages whose
+fingerprint changed are rendered again, and pages that no longer exist are
+removed.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+
+from flask import url_for
+
+import app as app_module
+from work_pool import WorkPool
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Runtime-only or query-string driven endpoints that make no sense as static files
+EXCLUDED_ENDPOINTS = {
+    'static', 'api_dataset_stats', 'api_listings', 'api_search', 'api_export', 'metrics',
+}
+
+# Endpoints rendered only from SERVICE_INFO/TOP_LLC_SERVICES, never the CSV
+STATIC_ENDPOINTS = {
+    'index', 'top10_llc_services', 'about', 'contact', 'privacy_policy',
+    'terms_and_conditions', 'api_services', 'asset',
+}
+
+# Files written to their own URL path rather than <url>/index.html
+FILE_MIMETYPES = {'text/css', 'application/javascript'}
+
+
+def _hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+
+def templates_fingerprint():
+    """Hash of every template file and asset bundle; an edit rebuilds all pages"""
+    digest = hashlib.sha1(app_module.assets.version.encode('ascii'))
+    template_dir = os.path.join(app_module.app.root_path, 'templates')
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), 'rb') as f:
+            digest.update(name.encode('utf-8') + b'\0' + f.read())
+    return digest.hexdigest()[:20]
+
+
+def argument_values(dataset):
+    """Values used to expand each URL argument; callables depend on the other arguments"""
+    return {
+        'service_name': list(app_module.TOP_LLC_SERVICES),
+        'state': list(dataset.states),
+        'city': lambda args: [item['city'] for item in
+                              dataset.cities(args['state'])[:app_module.CITY_LINKS]],
+        'page': lambda args: fragment_pages(dataset, args),
+        'filename': sorted(app_module.assets.by_filename),
+    }
+
+
+def fragment_pages(dataset, args):
+    """Numbers of the fragment pages following the first page of a state or city listing"""
+    if 'city' in args:
+        total = next((item['count'] for item in dataset.cities(args['state'])
+                      if item['city'] == args['city']), 0)
+    else:
+        total = dataset.state_stats(args['state'])['services']
+    return range(2, -(-total // app_module.LISTING_PAGE_SIZE) + 1)
+
+
+def expand(names, values):
+    """Yield every combination of argument values for ``names``"""
+    fixed = [name for name in names if not callable(values[name])]
+    dependent = [name for name in names if callable(values[name])]
+    for combo in itertools.product(*(values[name] for name in fixed)):
+        args = dict(zip(fixed, combo))
+        combos = [args]
+        for name in dependent:
+            combos = [dict(partial, **{name: value})
+                      for partial in combos for value in values[name](partial)]
+        yield from combos
+
+
+def collect_pages(dataset):
+    """Return [(url, fingerprint)] for every buildable page"""
+    app = app_module.app
+    values = argument_values(dataset)
+    base = templates_fingerprint()
+    state_hashes = {}
+    pages = []
+
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if rule.endpoint in EXCLUDED_ENDPOINTS or 'GET' not in rule.methods:
+            continue
+        names = sorted(rule.arguments)
+        missing = [name for name in names if name not in values]
+        if missing:
+            print(f"Skipping {rule.rule}: no values for {', '.join(missing)}")
+            continue
+
+        for args in expand(names, values):
+            parts = [base, rule.endpoint]
+            if 'service_name' in args:
+                parts.append(app_module.SERVICE_INFO.get(args['service_name']))
+            else:
+                parts.append(app_module.CONTENT_VERSION)
+            if 'state' in args:
+                state = args['state']
+                if state not in state_hashes:
+                    # First listing page, city links and the summary over every row
+                    state_hashes[state] = _hash(
+                        dataset.state_records(state, limit=app_module.LISTING_PAGE_SIZE + 1),
+                        dataset.cities(state),
+                        dataset.state_stats(state))
+                parts.append(state_hashes[state])
+            elif rule.endpoint not in STATIC_ENDPOINTS:
+                parts.append(dataset.version)
+
+            with app.test_request_context():
+                if 'city' in args or 'page' in args:
+                    # The listing page shown, and the link to the next one
+                    parts.append(app_module.listing_page(
+                        dataset, args['service_name'], args['state'], args.get('city'),
+                        args.get('page', 1)))
+                url = url_for(rule.endpoint, **args)
+            pages.append((url, _hash(*parts)))
+    return pages
+
+
+def output_path(out_dir, url, mimetype):
+    """Map a URL to its file under ``out_dir``"""
+    path = unquote(url).strip('/')
+    if mimetype == 'application/json':
+        return os.path.join(out_dir, path + '.json')
+    if mimetype in FILE_MIMETYPES:
+        return os.path.join(out_dir, path)
+    return os.path.join(out_dir, path, 'index.html')
+
+
+def _init_worker():
+    # Workers render each page once; caching bodies would only waste memory
+    app_module.page_cache.max_bytes = 0
+    # A forked worker inherits the work pool but not its threads, so
+    # offloaded work would never run: do it inline, without refreshes
+    app_module.work_pool = WorkPool(max_workers=0)
+    app_module.page_cache.refresh = None
+
+
+def render_batch(out_dir, urls):
+    """Render ``urls`` and write them below ``out_dir``; returns results"""
+    client = app_module.app.test_client()
+    results = []
+    for url in urls:
+        response = client.get(url)
+        if response.status_code != 200:
+            results.append((url, None, response.status_code))
+            continue
+        path = output_path(out_dir, url, response.mimetype)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(response.get_data())
+        results.append((url, os.path.relpath(path, out_dir), 200))
+    return results
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('pages', {})
+
+
+def build(out_dir, jobs=None, force=False):
+    """Build the static site; returns (rendered, skipped, failed)"""
+    started = time.time()
+    dataset = app_module.get_dataset()
+    pages = collect_pages(dataset)
+    previous = {} if force else load_manifest(out_dir)
+
+    manifest = {}
+    todo = []
+    for url, fingerprint in pages:
+        entry = previous.get(url)
+        if (entry and entry['fingerprint'] == fingerprint
+                and os.path.exists(os.path.join(out_dir, entry['file']))):
+            manifest[url] = entry
+        else:
+            todo.append(url)
+
+    jobs = jobs or os.cpu_count() or 1
+    batches = [todo[i::jobs] for i in range(jobs) if todo[i::jobs]]
+    results = []
+    if jobs == 1 or len(batches) <= 1:
+        # Rendered in this process: skip page caching for the build only
+        page_cache = app_module.page_cache
+        max_bytes, page_cache.max_bytes = page_cache.max_bytes, 0
+        try:
+            for batch in batches:
+                results.extend(render_batch(out_dir, batch))
+        finally:
+            page_cache.max_bytes = max_bytes
+    else:
+        with ProcessPoolExecutor(max_workers=len(batches), initializer=_init_worker) as pool:
+            for batch_results in pool.map(render_batch, itertools.repeat(out_dir), batches):
+                results.extend(batch_results)
+
+    fingerprints = dict(pages)
+    failed = 0
+    for url, path, status in results:
+        if path is None:
+            print(f"Failed to render {url}: HTTP {status}")
+            failed += 1
+            continue
+        manifest[url] = {'file': path, 'fingerprint': fingerprints[url]}
+
+    # Remove files for pages that no longer exist
+    for url, entry in previous.items():
+        if url not in fingerprints:
+            try:
+                os.remove(os.path.join(out_dir, entry['file']))
+            except OSError:
+                pass
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': MANIFEST_VERSION,
+            'dataset_version': dataset.version,
+            'pages': manifest,
+        }, f, indent=1, sort_keys=True)
+
+    rendered = len(results) - failed
+    skipped = len(pages) - len(todo)
+    print(f"Built {rendered} pages ({skipped} unchanged, {failed} failed) "
+          f"into {out_dir} in {time.time() - started:.1f}s")
+    return rendered, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate the site as static files")
+    parser.add_argument('--out', default='dist', help="output directory (default: dist)")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true',
+                        help="ignore the manifest and rebuild every page")
+    args = parser.parse_args(argv)
+    _, _, failed = build(args.out, jobs=args.jobs, force=args.force)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,720 @@
+"""
+Shared in-memory dataset layer for the LLC Directory.
+
+The CSV is parsed once per process and kept in memory. Every call to
+``DatasetCache.get()`` stats the source file and only re-parses it when
+its mtime or size has changed. A reload builds a complete new ``Dataset``
+before swapping it in, so concurrent readers always see either the old or
+the new generation, never a half-loaded frame. ``current()`` keeps
+returning the old generation while the reload runs in the background, and
+the cache's ``prepare`` hook can build indexes on the new one before the
+swap, so a changed file never makes requests wait (see warmup.py).
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import geo
+import ingest
+import partitions
+import shared_dataset
+import snapshot
+from metrics import span
+
+# Try multiple possible paths for different environments
+CSV_PATHS = [
+    "LLC Data.csv",  # For Vercel deployment
+    r"C:\rozy\LLC Data.csv",  # For local development
+    "./LLC Data.csv",  # Alternative local path
+]
+
+
+# Attach to shared, memory-mapped generations instead of loading per process
+# (see shared_dataset.py); meant for pre-fork servers with several workers
+SHARED_DATASET = os.environ.get('SHARED_DATASET') == '1'
+
+# Serve from per-state partitions (see partitions.py), loading each state on
+# first use; meant for serverless instances that only see a few states
+PARTITIONED_DATA = os.environ.get('PARTITIONED_DATA') == '1'
+
+# Keep serving the loaded generation while a changed file reloads in a
+# background thread; set to 0 to make requests wait for the reload
+RELOAD_IN_BACKGROUND = os.environ.get('RELOAD_IN_BACKGROUND', '1') == '1'
+
+
+def file_signature(path):
+    """Return (path, mtime_ns, size) for a file, or None if it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+# Derived indexes rebuilt incrementally: a reload hands the previous
+# generation's value to the builder as builder(dataset, previous)
+INCREMENTAL_DERIVED = ('search',)
+
+# Cap on remembered per-state results (records, stats) per dataset
+MAX_CACHED_STATE_QUERIES = 1024
+
+# Listing types and cities shown per state on a service page
+PREVIEW_ROWS = 3
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+class StateIndex:
+    """
+    Canonical state key -> row positions, built once per dataset.
+
+    Keys come from ``geo.state_key``, so a lookup by full name, USPS code
+    or any casing/whitespace variant ("Texas", "TX", "texas ") is one
+    exact dictionary hit. "Virginia" no longer matches "West Virginia".
+    Rows with a missing state never match.
+    """
+
+    def __init__(self, series=None):
+        self.states = []
+        self._positions = {}
+        self._labels = None
+        if series is None or series.empty:
+            return
+
+        valid = series.notna().to_numpy()
+        present = series[valid]
+        self.states = sorted(present.unique().tolist())
+
+        # Key each distinct value once, then map rows through their codes
+        codes, uniques = pd.factorize(present)
+        keys = np.array([geo.state_key(value) for value in uniques], dtype=object)[codes]
+        row_positions = np.flatnonzero(valid)
+        groups = pd.Series(row_positions).groupby(keys, sort=False).indices
+        for key, idx in groups.items():
+            self._positions[key] = row_positions[idx]
+
+    @classmethod
+    def from_positions(cls, states, positions):
+        """Build an index from a ready key -> sorted positions mapping"""
+        index = cls()
+        index.states = list(states)
+        index._positions = dict(positions)
+        return index
+
+    @classmethod
+    def from_arrays(cls, states, keys, positions, offsets):
+        """Rebuild an index saved with ``to_arrays()``"""
+        index = cls()
+        index.states = list(states)
+        for i, key in enumerate(keys):
+            index._positions[key] = positions[offsets[i]:offsets[i + 1]]
+        return index
+
+    def to_arrays(self):
+        """Return (states, keys, positions, offsets) for serialization"""
+        keys = list(self._positions)
+        chunks = [self._positions[key] for key in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in chunks])
+        if chunks:
+            positions = np.concatenate(chunks).astype(np.int64)
+        else:
+            positions = np.empty(0, dtype=np.int64)
+        return self.states, keys, positions, offsets
+
+    def groups(self):
+        """(canonical key, row positions) pairs, one per distinct state"""
+        return self._positions.items()
+
+    def matching_keys(self, state):
+        """The canonical key of ``state`` in a list, or [] when no rows have it"""
+        key = geo.state_key(state)
+        return [key] if key in self._positions else []
+
+    def canonical(self, state):
+        """Spelling of ``state`` used in the data (and URLs), or None when unknown"""
+        if self._labels is None:
+            self._labels = {geo.state_key(label): label for label in self.states}
+        key = geo.state_key(state)
+        return self._labels.get(key) if key in self._positions else None
+
+    def positions(self, state):
+        """Return the sorted row positions for ``state``"""
+        return self._positions.get(geo.state_key(state), _NO_ROWS)
+
+    def count(self, state):
+        """Return how many rows match ``state``"""
+        return len(self.positions(state))
+
+
+# Columns the listing templates read from each business record
+RECORD_COLUMNS = (
+    'name', 'state', 'city', 'phone', 'address', 'full_address', 'rating',
+    'reviews', 'site', 'category', 'type', 'description', 'logo',
+)
+
+
+class PresentationView:
+    """
+    Template-ready copy of the record columns.
+
+    Every value is already a string and missing values are ''. Columns
+    are converted with vectorized operations once per dataset, so routes
+    only gather the rows they show. Categorical columns keep their codes
+    (memory-mapped for snapshots) and only their distinct labels are
+    converted; rows are looked up when they are gathered.
+    """
+
+    def __init__(self, df, columns=RECORD_COLUMNS):
+        self.columns = [column for column in columns if column in df.columns]
+        self._arrays = [self._to_strings(df[column]) for column in self.columns]
+
+    @staticmethod
+    def _to_strings(series):
+        """(codes, labels) for categorical/mixed columns, (None, values) for strings"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            uniques = series.cat.categories.tolist()
+        elif pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+            return None, series.where(series.notna(), '').to_numpy(dtype=object)
+        else:
+            codes, uniques = pd.factorize(series)
+            uniques = uniques.tolist()
+        # Convert each distinct value once; code -1 (missing) picks the trailing ''
+        labels = np.array([str(value) for value in uniques] + [''], dtype=object)
+        return codes, labels
+
+    def records(self, positions):
+        """Return a list of record dicts for the given row positions"""
+        columns = [values[positions] if codes is None else values.take(codes[positions])
+                   for codes, values in self._arrays]
+        return [dict(zip(self.columns, row)) for row in zip(*columns)]
+
+
+# Length of the top-N lists in /api/data-summary
+TOP_N = 10
+
+
+class Aggregates:
+    """Counts, unique counts and top-N lists computed once per dataset"""
+
+    def __init__(self, df, top_n=TOP_N):
+        city_counts = self._counts(df, 'city')
+        self._set_counts(len(df), self._counts(df, 'state'), city_counts, len(city_counts), top_n)
+
+    @classmethod
+    def from_counts(cls, total_records, state_counts, top_cities, unique_cities, top_n=TOP_N):
+        """Rebuild from saved counts; ``top_cities`` stands in for the full city counts"""
+        aggregates = cls.__new__(cls)
+        aggregates._set_counts(total_records, state_counts, top_cities, unique_cities, top_n)
+        return aggregates
+
+    def _set_counts(self, total_records, state_counts, city_counts, unique_cities, top_n):
+        self.total_records = total_records
+        self.state_counts = dict(state_counts)
+        self.city_counts = dict(city_counts)
+        self.unique_states = len(self.state_counts)
+        self.unique_cities = unique_cities
+        # value_counts() is already ordered by count, descending
+        self.top_states = dict(list(self.state_counts.items())[:top_n])
+        self.top_cities = dict(list(self.city_counts.items())[:top_n])
+        self.states = sorted(
+            ({'state': state, 'service_count': count}
+             for state, count in self.state_counts.items()),
+            key=lambda x: x['state'])
+
+    @staticmethod
+    def _counts(df, column):
+        if column not in df.columns:
+            return {}
+        counts = df[column].value_counts()
+        # Categorical columns also report unused categories with a zero count
+        counts = counts[counts > 0]
+        return {key: int(count) for key, count in counts.items()}
+
+    def summary(self):
+        """Return the /api/data-summary payload"""
+        return {
+            'total_records': self.total_records,
+            'unique_states': self.unique_states,
+            'unique_cities': self.unique_cities,
+            'top_states': self.top_states or [],
+            'top_cities': self.top_cities or [],
+        }
+
+
+class StateStats:
+    """
+    Per-state summary statistics over every row of each state.
+
+    Totals are computed per canonical state key with vectorized bincounts,
+    so a lookup is a few array reads.
+    """
+
+    def __init__(self, dataset):
+        df = dataset.df
+        self.state_index = dataset.state_index
+        groups = list(self.state_index.groups())
+        self._key_ids = {key: i for i, (key, _) in enumerate(groups)}
+
+        n_rows = len(df)
+        codes = np.full(n_rows, -1, dtype=np.int64)
+        for i, (_, positions) in enumerate(groups):
+            codes[positions] = i
+        in_state = codes >= 0
+        minlength = len(groups)
+
+        if 'rating' in df.columns:
+            ratings = pd.to_numeric(df['rating'], errors='coerce').to_numpy(
+                dtype=np.float64, na_value=np.nan)
+        else:
+            ratings = np.full(n_rows, np.nan)
+        rated = in_state & ~np.isnan(ratings)
+        self.rating_sum = np.bincount(codes[rated], weights=ratings[rated], minlength=minlength)
+        self.rating_count = np.bincount(codes[rated], minlength=minlength)
+
+        if 'phone' in df.columns:
+            phones = in_state & df['phone'].notna().to_numpy()
+        else:
+            phones = np.zeros(n_rows, dtype=bool)
+        self.phone_count = np.bincount(codes[phones], minlength=minlength)
+
+        # Distinct (state key, city) pairs -> city codes per state key
+        self.city_codes = [np.empty(0, dtype=np.int64)] * minlength
+        if 'city' in df.columns and minlength:
+            city_codes, _ = pd.factorize(df['city'])
+            has_city = in_state & (city_codes >= 0)
+            n_cities = int(city_codes.max()) + 1 if len(city_codes) else 0
+            pairs = np.unique(codes[has_city] * max(n_cities, 1) + city_codes[has_city])
+            pair_keys = pairs // max(n_cities, 1)
+            bounds = np.searchsorted(pair_keys, np.arange(minlength + 1))
+            self.city_codes = [pairs[bounds[i]:bounds[i + 1]] % max(n_cities, 1)
+                               for i in range(minlength)]
+
+    def for_state(self, state):
+        """Return {'services', 'avg_rating', 'city_count', 'phone_count'} for ``state``"""
+        i = self._key_ids.get(geo.state_key(state))
+        if i is None:
+            return {'services': 0, 'avg_rating': 0.0, 'city_count': 0, 'phone_count': 0}
+        rating_count = int(self.rating_count[i])
+        return {
+            'services': int(self.state_index.count(state)),
+            'avg_rating': float(self.rating_sum[i]) / rating_count if rating_count else 0.0,
+            'city_count': len(self.city_codes[i]),
+            'phone_count': int(self.phone_count[i]),
+        }
+
+
+class CityIndex:
+    """
+    State -> city -> row positions, with counts, built once per dataset.
+
+    For each canonical state key it holds the state's cities ordered by
+    business count and each city's row positions in file order. A city
+    page or ``/api/cities/<state>`` is then a couple of dict lookups,
+    however large the state.
+    """
+
+    def __init__(self, dataset):
+        df = dataset.df
+        self._cities = {}
+        self._positions = {}
+        if 'city' not in df.columns:
+            return
+
+        # Rows -> canonical city key ids (distinct values keyed once)
+        codes, uniques = pd.factorize(df['city'])
+        keys = [geo.city_key(value) for value in uniques]
+        key_ids, city_keys = pd.factorize(pd.Series(keys, dtype=object))
+        labels = {}
+        for key, value in zip(keys, uniques):
+            labels.setdefault(key, str(value))
+        row_keys = np.append(key_ids, -1)[codes]
+
+        for state_key, positions in dataset.state_index.groups():
+            cities = row_keys[positions]
+            has_city = cities >= 0
+            in_city = positions[has_city]
+            cities = cities[has_city]
+            # Stable sort keeps each city's positions in file order
+            order = np.argsort(cities, kind='stable')
+            ids, starts, counts = np.unique(cities[order], return_index=True, return_counts=True)
+            by_city = {}
+            listing = []
+            for city_id, start, count in zip(ids.tolist(), starts.tolist(), counts.tolist()):
+                key = city_keys[city_id]
+                by_city[key] = (labels[key], in_city[order[start:start + count]])
+                listing.append({'city': labels[key], 'count': count})
+            listing.sort(key=lambda item: (-item['count'], item['city']))
+            self._positions[state_key] = by_city
+            self._cities[state_key] = listing
+
+    def cities(self, state):
+        """[{'city', 'count'}] for ``state``, most businesses first"""
+        return self._cities.get(geo.state_key(state), [])
+
+    def _lookup(self, state, city):
+        return self._positions.get(geo.state_key(state), {}).get(geo.city_key(city))
+
+    def positions(self, state, city):
+        """Row positions for ``city`` in ``state``, in file order"""
+        found = self._lookup(state, city)
+        return found[1] if found is not None else _NO_ROWS
+
+    def canonical(self, state, city):
+        """Spelling of ``city`` used in the data, or None when ``state`` has no such city"""
+        found = self._lookup(state, city)
+        return found[0] if found is not None else None
+
+
+class Dataset:
+    """One loaded generation of the CSV and everything derived from it"""
+
+    def __init__(self, df, signature=None, state_index=None, version=None, source='csv',
+                 derived=None):
+        self.df = df
+        self.signature = signature
+        self.source = source
+        self.version = version or self._make_version(signature)
+        if state_index is None:
+            state_index = StateIndex(df['state'] if 'state' in df.columns else None)
+        self.state_index = state_index
+        self.aggregates = Aggregates(df)
+        self._presentation = None
+        self._records = {}
+        self._derived = dict(derived or {})
+        # Previous generation's INCREMENTAL_DERIVED values, until rebuilt here
+        self._previous = {}
+        # One lock per lazily built attribute, so independent builds run
+        # concurrently; _lock is only held to create those locks
+        self._build_locks = {}
+        self._lock = threading.Lock()
+        self._records_lock = threading.Lock()
+
+    @staticmethod
+    def _make_version(signature):
+        if signature is None:
+            return 'empty'
+        raw = '%s:%s:%d:%d' % signature
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    @property
+    def states(self):
+        """Sorted list of distinct, non-null state values"""
+        return self.state_index.states
+
+    @property
+    def presentation(self):
+        """PresentationView for this dataset, built on first use"""
+        if self._presentation is None:
+            with self._build_lock('presentation'):
+                if self._presentation is None:
+                    self._presentation = PresentationView(self.df)
+        return self._presentation
+
+    def _build_lock(self, name):
+        with self._lock:
+            lock = self._build_locks.get(name)
+            if lock is None:
+                lock = self._build_locks[name] = threading.Lock()
+            return lock
+
+    def derived(self, name, builder):
+        """
+        Return ``builder(self)``, computed once per dataset generation.
+
+        Used for indexes that only some routes need, so they are built on
+        first use instead of slowing down every load. After a reload the
+        builders of INCREMENTAL_DERIVED names also get the previous
+        generation's value (see inherit).
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._build_lock(name):
+                value = self._derived.get(name)
+                if value is None:
+                    previous = self._previous.pop(name, None)
+                    with span('build_' + name):
+                        value = builder(self) if previous is None else builder(self, previous)
+                    self._derived[name] = value
+        return value
+
+    def inherit(self, previous):
+        """Keep ``previous``'s incremental indexes for this generation's builds"""
+        for name in INCREMENTAL_DERIVED:
+            value = previous._derived.get(name)
+            if value is None:
+                value = previous._previous.get(name)
+            if value is not None and name not in self._derived:
+                self._previous[name] = value
+
+    def state_records(self, state, limit=None, offset=0):
+        """Return sanitized, ready-to-render records for ``state``"""
+        return self._records_for((geo.state_key(state),), limit, offset,
+                                 lambda: self.state_index.positions(state))
+
+    def _records_for(self, key, limit, offset, positions):
+        """Records for ``positions()[offset:offset + limit]``, cached under ``key``"""
+        key = key + (limit, offset)
+        records = self._records.get(key)
+        if records is not None:
+            return records
+
+        with span('records'):
+            rows = positions()[offset:]
+            if limit is not None:
+                rows = rows[:limit]
+            records = self.presentation.records(rows)
+        with self._records_lock:
+            if len(self._records) >= MAX_CACHED_STATE_QUERIES:
+                self._records.clear()
+            self._records[key] = records
+        return records
+
+    def state_stats(self, state):
+        """Summary panel figures over every row of ``state`` (see StateStats)"""
+        return self.derived('state_stats', StateStats).for_state(state)
+
+    def canonical_state(self, state):
+        """Canonical spelling of ``state`` (name, USPS code or variant), or None"""
+        return self.state_index.canonical(state)
+
+    def cities(self, state):
+        """Cities of ``state`` with business counts, most businesses first (see CityIndex)"""
+        return self.derived('cities', CityIndex).cities(state)
+
+    def canonical_city(self, state, city):
+        """Canonical spelling of ``city`` within ``state``, or None"""
+        return self.derived('cities', CityIndex).canonical(state, city)
+
+    def state_preview(self, state):
+        """Service page card for ``state``: row count, first rows' types and busiest cities"""
+        return {
+            'services': int(self.state_index.count(state)),
+            'types': [record.get('type', '')
+                      for record in self.state_records(state, limit=PREVIEW_ROWS)],
+            'cities': self.cities(state)[:PREVIEW_ROWS],
+        }
+
+    def city_records(self, state, city, limit=None, offset=0):
+        """Return ready-to-render records for ``city`` in ``state``"""
+        return self._records_for((geo.state_key(state), geo.city_key(city)), limit, offset,
+                                 lambda: self.derived('cities', CityIndex).positions(state, city))
+
+
+class DatasetCache:
+    """Process-wide, change-aware cache around the CSV file"""
+
+    def __init__(self, paths=None, shared=None, partitioned=None, background=None):
+        self.paths = list(paths) if paths is not None else list(CSV_PATHS)
+        self.shared = SHARED_DATASET if shared is None else shared
+        self.partitioned = PARTITIONED_DATA if partitioned is None else partitioned
+        self.background = RELOAD_IN_BACKGROUND if background is None else background
+        # prepare(dataset) runs on a reloaded generation before it is served;
+        # published(dataset) runs in a background thread afterwards. The first
+        # load of a process skips both unless warm_first_load is set
+        self.prepare = None
+        self.published = None
+        self.warm_first_load = False
+        self._dataset = None
+        self._reloader = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.stale_hits = 0
+
+    def _locate(self):
+        """
+        Return the signature of the file to load.
+
+        For each candidate path a fresh snapshot (see snapshot.py) wins over
+        the CSV itself; the first path with either is used. In shared mode
+        the path's live shared generation comes first, in partitioned mode
+        a fresh partition catalog.
+        """
+        for path in self.paths:
+            if self.shared:
+                signature = shared_dataset.locate(path)
+                if signature is not None:
+                    return signature
+            csv_signature = file_signature(path)
+            if self.partitioned:
+                catalog_signature = file_signature(partitions.catalog_path_for(path))
+                if snapshot.is_fresh(catalog_signature, csv_signature):
+                    return ('partitions', path) + catalog_signature[1:]
+            snapshot_signature = file_signature(snapshot.meta_path_for(path))
+            if snapshot.is_fresh(snapshot_signature, csv_signature):
+                return ('snapshot', path) + snapshot_signature[1:]
+            if csv_signature is not None:
+                return ('csv',) + csv_signature
+        return None
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def current(self):
+        """
+        Return the cached Dataset if it is still fresh, else None (never loads).
+
+        With ``background`` set, a dataset whose file has changed is still
+        returned while a background thread loads the new generation.
+        """
+        dataset = self._dataset
+        if dataset is None:
+            return None
+        if dataset.signature == self._locate():
+            self._count('hits')
+            return dataset
+        if self.background:
+            self._reload_in_background()
+            self._count('stale_hits')
+            return dataset
+        return None
+
+    def _reload_in_background(self):
+        with self._stats_lock:
+            if self._reloader is not None and self._reloader.is_alive():
+                return
+            self._reloader = threading.Thread(target=self.get, name='dataset-reload',
+                                              daemon=True)
+            self._reloader.start()
+
+    def _run_hook(self, hook, dataset):
+        if hook is None:
+            return
+        try:
+            hook(dataset)
+        except Exception as e:
+            print(f"Dataset hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def _after_publish(self, dataset, prepared):
+        def run():
+            if not prepared:
+                self._run_hook(self.prepare, dataset)
+            self._run_hook(self.published, dataset)
+        if self.published is not None or (self.prepare is not None and not prepared):
+            threading.Thread(target=run, name='dataset-published', daemon=True).start()
+
+    def get(self):
+        """Return the current Dataset, reloading it if the file changed"""
+        signature = self._locate()
+        dataset = self._dataset
+        if dataset is not None and dataset.signature == signature:
+            self._count('hits')
+            return dataset
+
+        with self._lock:
+            # Another thread may have finished the reload while we waited
+            dataset = self._dataset
+            if dataset is not None and dataset.signature == signature:
+                self._count('hits')
+                return dataset
+
+            self._count('misses' if dataset is None else 'reloads')
+            with span('data_load'):
+                new_dataset = self._load(signature, dataset)
+            if isinstance(dataset, Dataset) and isinstance(new_dataset, Dataset):
+                new_dataset.inherit(dataset)
+            # A reload is prepared while the old generation is still served.
+            # The first load is served at once: warming it in the background
+            # would compete with the requests it is meant to speed up
+            reloaded = dataset is not None
+            if reloaded:
+                self._run_hook(self.prepare, new_dataset)
+            # Single reference assignment: readers see old or new, never partial
+            self._dataset = new_dataset
+        if reloaded or self.warm_first_load:
+            self._after_publish(new_dataset, prepared=reloaded)
+        return new_dataset
+
+    def _load(self, signature, previous):
+        """Build a new Dataset for ``signature``"""
+        if signature is None:
+            print("CSV file not found in any of the expected locations")
+            return Dataset(pd.DataFrame())
+
+        kind, csv_path = signature[:2]
+        if kind == 'shared':
+            try:
+                dataset = shared_dataset.load_generation(csv_path, signature)
+                print(f"Attached to shared dataset generation: {csv_path}")
+                return dataset
+            except Exception as e:
+                print(f"Error attaching to shared dataset {csv_path}: {e}")
+                if previous is not None:
+                    return Dataset(previous.df, signature, state_index=previous.state_index)
+                return Dataset(pd.DataFrame(), signature)
+        if kind == 'partitions':
+            try:
+                dataset = partitions.open_partitions(csv_path, signature)
+                print(f"Opened state partitions for: {csv_path}")
+                return dataset
+            except Exception as e:
+                print(f"Error opening partitions for {csv_path}, falling back to CSV: {e}")
+        if kind == 'snapshot':
+            try:
+                df, state_index, version = snapshot.load_snapshot(csv_path)
+                print(f"Successfully loaded snapshot for: {csv_path}")
+                return Dataset(df, signature, state_index=state_index,
+                               version=version, source='snapshot')
+            except Exception as e:
+                print(f"Error loading snapshot for {csv_path}, falling back to CSV: {e}")
+
+        try:
+            started = time.perf_counter()
+            df, state_index, derived = ingest.load_csv_chunked(csv_path)
+            seconds = time.perf_counter() - started
+        except Exception as e:
+            print(f"Error loading CSV from {csv_path}: {e}")
+            # Keep serving the last good frame; retry once the file changes again
+            if previous is not None:
+                return Dataset(previous.df, signature, state_index=previous.state_index)
+            return Dataset(pd.DataFrame(), signature)
+
+        print(f"Successfully loaded CSV from: {csv_path} "
+              f"({len(df)} rows in {seconds:.2f}s)")
+        return Dataset(df, signature, state_index=state_index, derived=derived)
+
+    def stats(self):
+        """Return hit/miss/reload counters and the current dataset version"""
+        dataset = self._dataset
+        with self._stats_lock:
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'stale_hits': self.stale_hits,
+                'reloading': self._reloader is not None and self._reloader.is_alive(),
+                'version': dataset.version if dataset is not None else None,
+                'source': dataset.source if dataset is not None else None,
+                'records': dataset.aggregates.total_records if dataset is not None else 0,
+            }
+        if self.partitioned:
+            stats['partitions'] = partitions.partition_cache.stats()
+        return stats
+
+    def clear(self):
+        """Drop the cached dataset so the next get() loads from disk"""
+        with self._lock:
+            self._dataset = None
+
+
+# Shared by every route in the process
+dataset_cache = DatasetCache()
+
+
+def get_dataset():
+    """Return the current Dataset from the process-wide cache"""
+    return dataset_cache.get()
@@ -0,0 +1,57 @@
+"""
+Streaming CSV and NDJSON exports of the business listings.
+
+``/api/export/<format>`` takes the same filters and sort as
+``/api/listings`` and streams every matching row. Rows are gathered and
+encoded ``CHUNK_ROWS`` at a time by a generator, so memory stays at one
+chunk plus the matching row positions however large the result is, and
+a slow client only holds up its own generator. When the client accepts
+gzip the chunks are compressed as they are produced, each ending on a
+flush point so the client can decode what it has received so far.
+"""
+
+import zlib
+
+from listings import LISTING_COLUMNS
+
+# Rows encoded per chunk
+CHUNK_ROWS = 1000
+
+# Format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _encode_csv(frame, first):
+    return frame.to_csv(index=False, header=first, lineterminator='\r\n')
+
+
+def _encode_ndjson(frame, first):
+    text = frame.to_json(orient='records', lines=True, force_ascii=False)
+    return text if text.endswith('\n') else text + '\n'
+
+
+ENCODERS = {'csv': _encode_csv, 'ndjson': _encode_ndjson}
+
+
+def generate(df, chunks, fmt):
+    """Yield ``fmt``-encoded bytes for each chunk of row positions"""
+    columns = [column for column in LISTING_COLUMNS if column in df.columns]
+    encode = ENCODERS[fmt]
+    first = True
+    for positions in chunks:
+        yield encode(df.iloc[positions][columns], first).encode('utf-8')
+        first = False
+    if first and fmt == 'csv':
+        # No matches: still send the header row
+        yield encode(df.iloc[:0][columns], True).encode('utf-8')
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a byte stream incrementally, flushing after every chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,113 @@
+"""
+Canonical state and city keys.
+
+Every spelling of a state maps to one key. Full names, USPS codes, and
+casing, whitespace and punctuation variants are all accepted, so
+"Texas", "texas ", "TX" and "tx" all become ``'TX'``. States outside the
+table keep their cleaned, lowercased text as the key. Cities are keyed by
+their cleaned, lowercased text.
+
+``canonicalize`` rewrites a column so each key has a single spelling: the
+official name for known states, otherwise the most common spelling in
+the data. Ingest applies it to ``state`` and ``city``, so every lookup
+afterwards is an exact dictionary hit on the key.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# USPS code -> official name (states, DC and inhabited territories)
+STATE_NAMES = {
+    'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas',
+    'CA': 'California', 'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware',
+    'DC': 'District of Columbia', 'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii',
+    'ID': 'Idaho', 'IL': 'Illinois', 'IN': 'Indiana', 'IA': 'Iowa',
+    'KS': 'Kansas', 'KY': 'Kentucky', 'LA': 'Louisiana', 'ME': 'Maine',
+    'MD': 'Maryland', 'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota',
+    'MS': 'Mississippi', 'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska',
+    'NV': 'Nevada', 'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico',
+    'NY': 'New York', 'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio',
+    'OK': 'Oklahoma', 'OR': 'Oregon', 'PA': 'Pennsylvania', 'RI': 'Rhode Island',
+    'SC': 'South Carolina', 'SD': 'South Dakota', 'TN': 'Tennessee', 'TX': 'Texas',
+    'UT': 'Utah', 'VT': 'Vermont', 'VA': 'Virginia', 'WA': 'Washington',
+    'WV': 'West Virginia', 'WI': 'Wisconsin', 'WY': 'Wyoming',
+    'AS': 'American Samoa', 'GU': 'Guam', 'MP': 'Northern Mariana Islands',
+    'PR': 'Puerto Rico', 'VI': 'U.S. Virgin Islands',
+}
+
+# Other common spellings, already cleaned (see _clean)
+STATE_ALIASES = {
+    'washington dc': 'DC', 'washington d c': 'DC', 'd c': 'DC',
+    'us virgin islands': 'VI', 'virgin islands': 'VI',
+}
+
+# Dropped inside words ("D.C." -> "DC"); any other punctuation separates words
+_JOINING = re.compile(r"[.'’]")
+_SEPARATING = re.compile(r'[^\w\s]|_')
+
+
+def text_key(value):
+    """Lowercased text with surrounding and repeated whitespace removed"""
+    return ' '.join(str(value).split()).lower()
+
+
+def _clean(value):
+    """text_key with punctuation removed ("Washington, D.C." -> "washington dc")"""
+    return text_key(_SEPARATING.sub(' ', _JOINING.sub('', str(value))))
+
+
+_STATE_KEYS = dict(STATE_ALIASES)
+for _code, _name in STATE_NAMES.items():
+    _STATE_KEYS[_code.lower()] = _code
+    _STATE_KEYS[_clean(_name)] = _code
+
+
+def state_key(value):
+    """Canonical key for any spelling of a state"""
+    cleaned = _clean(value)
+    return _STATE_KEYS.get(cleaned, cleaned)
+
+
+def city_key(value):
+    """Canonical key for a city name"""
+    return text_key(value)
+
+
+def state_name(key):
+    """Official name for a state key, or None for states outside the table"""
+    return STATE_NAMES.get(key)
+
+
+def canonicalize(series, key_func, preferred=None):
+    """
+    Return ``series`` as a categorical with one spelling per key.
+
+    Each key is spelled ``preferred(key)`` when that is not None, otherwise
+    by its most frequent spelling in ``series`` (whitespace cleaned). Only
+    the distinct values are examined; rows are remapped with their codes.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    spellings = {}
+    for value, count in series.value_counts(sort=False).items():
+        if count:
+            spelling = (key_func(value), ' '.join(str(value).split()))
+            spellings[spelling] = spellings.get(spelling, 0) + count
+    best = {}
+    for (key, spelling), count in spellings.items():
+        if key not in best or count > best[key][1]:
+            best[key] = (spelling, count)
+
+    labels = []
+    for value in series.cat.categories:
+        key = key_func(value)
+        label = preferred(key) if preferred is not None else None
+        labels.append(label or (best[key][0] if key in best else None))
+    new_codes, uniques = pd.factorize(pd.Series(labels, dtype=object))
+    # Trailing -1 keeps missing values missing
+    remap = np.append(new_codes, -1)
+    codes = remap[series.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=series.index,
+                     name=series.name)
@@ -0,0 +1,166 @@
+"""
+Compression, ETag and Cache-Control handling for every response.
+
+``HttpCache`` registers an ``after_request`` hook that, for each
+successful buffered response:
+
+- applies the route's cache policy (``policies`` maps endpoint names to a
+  Cache-Control value; views that set their own header keep it);
+- gives the response a strong ETag (a hash of the body unless the view
+  already set one);
+- compresses text-like bodies with brotli (when the ``brotli`` package is
+  installed) or gzip, whichever the client prefers, suffixing the ETag
+  with the encoding so each variant validates separately;
+- answers ``If-None-Match`` / ``If-Modified-Since`` with 304.
+
+Compressed variants are kept in a small LRU keyed by ETag, so stable
+responses (the same JSON or HTML sent repeatedly) are only compressed
+once. Responses that are already encoded (the page cache and the asset
+bundles compress their own bodies) and streamed responses pass through.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+from metrics import span
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 500
+
+# Memory budget for cached compressed variants
+DEFAULT_VARIANT_BYTES = 16 * 1024 * 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml',
+    'application/x-ndjson', 'image/svg+xml',
+}
+
+# Cache-Control for routes without an explicit policy
+DEFAULT_HTML_POLICY = 'public, max-age=300'
+DEFAULT_POLICY = 'public, no-cache'
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def compress(data, encoding):
+    """Compress ``data`` with ``encoding`` ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+class VariantCache:
+    """Bounded LRU of compressed bodies keyed by (etag, encoding)"""
+
+    def __init__(self, max_bytes=DEFAULT_VARIANT_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag, encoding, data):
+        """Return the compressed body, compressing and caching it on a miss"""
+        key = (etag, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+        body = compress(data, encoding)
+        if len(body) > self.max_bytes:
+            return body
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = body
+                self.bytes += len(body)
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= len(evicted)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class HttpCache:
+    """after_request hook adding cache policy, ETag, compression and 304s"""
+
+    def __init__(self, app=None, policies=None, max_variant_bytes=DEFAULT_VARIANT_BYTES):
+        self.policies = dict(policies or {})
+        self.variants = VariantCache(max_variant_bytes)
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.process_response)
+
+    def policy_for(self, endpoint, mimetype):
+        if endpoint in self.policies:
+            return self.policies[endpoint]
+        return DEFAULT_HTML_POLICY if mimetype == 'text/html' else DEFAULT_POLICY
+
+    def negotiate(self):
+        """Best encoding the client accepts, or None"""
+        return request.accept_encodings.best_match(self.encodings)
+
+    def process_response(self, response):
+        if response.status_code not in (200, 304):
+            return response
+        if 'Cache-Control' not in response.headers:
+            policy = self.policy_for(request.endpoint, response.mimetype)
+            if policy:
+                response.headers['Cache-Control'] = policy
+        if (response.status_code != 200 or response.is_streamed
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or 'no-store' in response.headers.get('Cache-Control', '')):
+            return response
+
+        data = response.get_data()
+        etag, _ = response.get_etag()
+        if etag is None:
+            etag = hashlib.sha1(data).hexdigest()[:20]
+
+        if is_compressible(response.mimetype) and len(data) >= MIN_COMPRESS_SIZE:
+            response.vary.add('Accept-Encoding')
+            encoding = self.negotiate()
+            if encoding:
+                with span('compress'):
+                    response.set_data(self.variants.get(etag, encoding, data))
+                response.headers['Content-Encoding'] = encoding
+                etag = f'{etag}-{encoding}'
+
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def stats(self):
+        stats = self.variants.stats()
+        stats['encodings'] = list(self.encodings)
+        return stats
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Chunked CSV ingestion for large "LLC Data.csv" files.
+
+``load_csv_chunked`` reads the file in fixed-size chunks with explicit
+dtypes, keeps only the columns the app uses, stores low-cardinality text
+columns as categoricals, and builds the state and city indexes while the
+chunks stream past. ``state`` and ``city`` are then rewritten to one
+canonical spelling per key (see geo.py). Each chunk is split into its
+columns as it arrives, and the columns are merged one at a time, each
+column's pieces freed once merged. Peak memory is therefore about the
+compact frame plus one chunk and one column, not two copies of the frame.
+The whole frame still has to fit in memory.
+
+    python ingest.py ["LLC Data.csv"] [--compare]
+
+prints rows/sec and peak RSS for the chunked loader; ``--compare`` also
+measures a plain ``pd.read_csv`` in a separate process.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import geo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Explicit dtypes for every column the app reads; anything else is dropped
+COLUMN_DTYPES = {
+    'name': str,
+    'state': 'category',
+    'city': 'category',
+    'phone': str,
+    'address': str,
+    'full_address': str,
+    'rating': 'float64',
+    'reviews': 'float64',
+    'site': str,
+    'category': 'category',
+    'type': 'category',
+    'description': str,
+    'working_hours': str,
+    'logo': str,
+}
+
+# Parsed as float64 (much faster than the nullable parser), then stored as
+# nullable integers so review counts still render as "12", not "12.0"
+INTEGER_COLUMNS = ('reviews',)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+class PositionIndexBuilder:
+    """Accumulates value -> row positions across chunks"""
+
+    def __init__(self):
+        self._parts = {}
+
+    def add(self, series, offset):
+        codes, uniques = pd.factorize(series)
+        # Stable sort keeps each group's positions ascending; -1 (missing) sorts first
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for code, value in enumerate(uniques.tolist()):
+            positions = order[bounds[code]:bounds[code + 1]] + offset
+            self._parts.setdefault(value, []).append(positions)
+
+    def finish(self, normalize):
+        """Return (sorted raw values, normalized key -> sorted positions)"""
+        merged = {}
+        for value, parts in self._parts.items():
+            merged.setdefault(normalize(value), []).extend(parts)
+        positions = {}
+        for key, parts in merged.items():
+            combined = np.concatenate(parts)
+            if len(parts) > 1:
+                combined.sort()
+            positions[key] = combined
+        return sorted(self._parts), positions
+
+
+def _to_nullable_int(series):
+    """float64 -> Int64 when every present value is a whole number"""
+    values = series.to_numpy()
+    present = values[~np.isnan(values)]
+    if not np.array_equal(present, np.floor(present)):
+        return series
+    return series.astype('Int64')
+
+
+def concat_columns(parts, columns):
+    """
+    Build a frame from ``parts`` (column -> list of chunk Series).
+
+    Columns are merged one at a time and each column's pieces are removed
+    from ``parts`` as soon as it is merged, so the merged frame and the
+    pieces are never all held at once. Categorical columns get unified
+    categories.
+    """
+    if not parts or not parts[columns[0]]:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(index=pd.RangeIndex(sum(len(piece) for piece in parts[columns[0]])))
+    for column in columns:
+        pieces = parts.pop(column)
+        if isinstance(pieces[0].dtype, pd.CategoricalDtype):
+            df[column] = pd.Series(union_categoricals(pieces), name=column)
+        else:
+            df[column] = pd.concat(pieces, ignore_index=True)
+        del pieces
+    return df
+
+
+def concat_chunks(chunks, columns):
+    """Concatenate chunks, unifying the categories of categorical columns"""
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return concat_columns({column: [chunk[column] for chunk in chunks] for column in columns},
+                          columns)
+
+
+def load_csv_chunked(csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read ``csv_path`` chunk by chunk.
+
+    Returns ``(df, state_index, derived)`` where ``derived`` holds indexes
+    to seed into the Dataset (currently ``city_postings``).
+    """
+    from data_store import StateIndex
+    from listings import normalize_value
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    columns = [column for column in header if column in COLUMN_DTYPES]
+    dtypes = {column: COLUMN_DTYPES[column] for column in columns}
+
+    states = PositionIndexBuilder()
+    cities = PositionIndexBuilder()
+    parts = {column: [] for column in columns}
+    offset = 0
+    reader = pd.read_csv(csv_path, usecols=columns, dtype=dtypes, chunksize=chunk_size)
+    for chunk in reader:
+        chunk = chunk[columns]
+        for column in INTEGER_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = _to_nullable_int(chunk[column])
+        if 'state' in chunk.columns:
+            states.add(chunk['state'], offset)
+        if 'city' in chunk.columns:
+            cities.add(chunk['city'], offset)
+        for column in columns:
+            # Copied out of the chunk's 2-D blocks, so each column can be freed alone
+            parts[column].append(chunk[column].copy())
+        offset += len(chunk)
+        del chunk
+
+    df = concat_columns(parts, columns)
+    state_values = []
+    if 'state' in df.columns:
+        df['state'] = geo.canonicalize(df['state'], geo.state_key, geo.state_name)
+        state_values = df['state'].cat.categories.tolist()
+    if 'city' in df.columns:
+        df['city'] = geo.canonicalize(df['city'], geo.city_key)
+    _, state_positions = states.finish(geo.state_key)
+    state_index = StateIndex.from_positions(sorted(state_values), state_positions)
+    _, city_postings = cities.finish(normalize_value)
+    return df, state_index, {'city_postings': city_postings}
+
+
+def measure(csv_path, mode, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Load ``csv_path`` with one loader and return timing and memory figures"""
+    started = time.perf_counter()
+    if mode == 'pandas':
+        df = pd.read_csv(csv_path)
+    else:
+        df, _, _ = load_csv_chunked(csv_path, chunk_size)
+    seconds = time.perf_counter() - started
+    return {
+        'loader': mode,
+        'rows': len(df),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': int(len(df) / seconds) if seconds else None,
+        'frame_mb': round(df.memory_usage(deep=True).sum() / (1024 * 1024), 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked CSV ingestion and load statistics")
+    parser.add_argument('csv_path', nargs='?', default="LLC Data.csv")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--compare', action='store_true',
+                        help="also measure plain pd.read_csv (in a separate process)")
+    parser.add_argument('--mode', choices=('chunked', 'pandas'), default='chunked',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if not args.compare:
+        result = measure(args.csv_path, args.mode, args.chunk_size)
+        print(json.dumps(result) if args.json else result)
+        return 0
+
+    # Peak RSS is a per-process high-water mark, so each loader gets its own process
+    for mode in ('pandas', 'chunked'):
+        output = subprocess.run(
+            [sys.executable, __file__, args.csv_path, '--mode', mode,
+             '--chunk-size', str(args.chunk_size), '--json'],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['loader']:>8}: {result['rows']} rows in {result['seconds']}s "
+              f"({result['rows_per_sec']} rows/s), frame {result['frame_mb']} MB, "
+              f"peak RSS {result['peak_rss_mb']} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
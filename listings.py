@@ -0,0 +1,302 @@
+"""
+Filterable, paginated business listings served from precomputed indexes.
+
+A ``ListingIndex`` is built once per dataset generation (on first use) and
+holds:
+
+- posting lists (sorted row positions) for each normalized city,
+  category and type value; states use the dataset's StateIndex;
+- for each sort order, the row permutation plus the sorted keys, so a
+  keyset cursor can be located with a binary search.
+
+Queries intersect the posting lists of the requested filters and then
+pick the next ``limit`` rows after the cursor in sort order. Without
+filters the sorted permutation is walked directly, so a page costs
+O(limit) no matter how many rows the dataset has.
+"""
+
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+from geo import text_key
+from metrics import span
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Columns that can be filtered by exact (case-insensitive) value
+FILTER_COLUMNS = ('city', 'category', 'type')
+
+# Sort name -> source column; None sorts by file order
+SORT_COLUMNS = {
+    'default': None,
+    'rating': 'rating',
+    'reviews': 'reviews',
+}
+
+# Columns returned for each listing
+LISTING_COLUMNS = (
+    'name', 'state', 'city', 'phone', 'full_address', 'rating', 'reviews',
+    'site', 'category', 'type', 'description', 'working_hours', 'logo',
+)
+
+
+class ListingQueryError(ValueError):
+    """Raised for invalid filter, sort or cursor parameters"""
+
+
+def normalize_value(value):
+    """Key used for exact-match filters"""
+    return text_key(value)
+
+
+def encode_cursor(sort, key, position):
+    raw = json.dumps([sort, key, int(position)]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, key, position = json.loads(base64.urlsafe_b64decode(padded))
+        key, position = float(key), int(position)
+    except (ValueError, TypeError):
+        raise ListingQueryError("invalid cursor")
+    if cursor_sort != sort:
+        raise ListingQueryError("cursor was issued for a different sort order")
+    return key, position
+
+
+def postings_to_arrays(postings):
+    """Serialize {key: sorted positions} as (keys, offsets, positions)"""
+    keys = list(postings)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[key]) for key in keys])
+    if keys:
+        positions = np.concatenate([postings[key] for key in keys]).astype(np.int64)
+    else:
+        positions = np.empty(0, dtype=np.int64)
+    return keys, offsets, positions
+
+
+def postings_from_arrays(keys, offsets, positions):
+    """Rebuild postings saved with ``postings_to_arrays`` (slices share ``positions``)"""
+    return {key: positions[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+
+def json_records(df, positions):
+    """Records for ``positions`` with LISTING_COLUMNS; missing values become None"""
+    with span('serialize'):
+        columns = [column for column in LISTING_COLUMNS if column in df.columns]
+        frame = df.iloc[positions][columns]
+        frame = frame.astype(object).where(frame.notna(), None)
+        return frame.to_dict('records')
+
+
+class SortOrder:
+    """Row permutation for one sort, with keys for keyset pagination"""
+
+    # Arrays saved by ListingIndex.to_arrays()
+    ARRAYS = ('permutation', 'sorted_keys', 'keys', 'rank')
+
+    def __init__(self, name, values, n_rows):
+        self.name = name
+        positions = np.arange(n_rows)
+        if values is None:
+            keys = positions.astype(np.float64)
+        else:
+            # Descending by value, missing values last, ties in file order
+            keys = -values.astype(np.float64)
+            keys[np.isnan(keys)] = np.inf
+        self.permutation = np.lexsort((positions, keys))
+        self.sorted_keys = keys[self.permutation]
+        self.keys = keys
+        self.rank = np.empty(n_rows, dtype=np.int64)
+        self.rank[self.permutation] = np.arange(n_rows)
+
+    @classmethod
+    def from_arrays(cls, name, arrays):
+        """Rebuild a sort order from its saved ARRAYS"""
+        order = cls.__new__(cls)
+        order.name = name
+        for field in cls.ARRAYS:
+            setattr(order, field, arrays[field])
+        return order
+
+    def start_after(self, key, position):
+        """Rank of the first row strictly after (key, position)"""
+        lo = np.searchsorted(self.sorted_keys, key, side='left')
+        hi = np.searchsorted(self.sorted_keys, key, side='right')
+        # Within equal keys the permutation is ordered by row position
+        return lo + np.searchsorted(self.permutation[lo:hi], position, side='right')
+
+    def cursor_for(self, position):
+        key = self.keys[position]
+        return encode_cursor(self.name, float(key), position)
+
+
+class ListingIndex:
+    """Posting lists and sort orders for one dataset generation"""
+
+    def __init__(self, dataset):
+        df = dataset.df
+        self.dataset = dataset
+        self.n_rows = len(df)
+
+        self.postings = self._filter_postings(dataset)
+        self.ratings = self._numeric(df, 'rating')
+        self.sorts = {}
+        for name, column in SORT_COLUMNS.items():
+            values = None if column is None else self._numeric(df, column)
+            self.sorts[name] = SortOrder(name, values, self.n_rows)
+
+    @classmethod
+    def from_arrays(cls, dataset, arrays):
+        """Rebuild an index saved with ``to_arrays()`` (postings come from the dataset)"""
+        index = cls.__new__(cls)
+        index.dataset = dataset
+        index.n_rows = len(dataset.df)
+        index.postings = cls._filter_postings(dataset)
+        index.ratings = arrays['ratings']
+        index.sorts = {
+            name: SortOrder.from_arrays(name, {field: arrays[f'{name}.{field}']
+                                               for field in SortOrder.ARRAYS})
+            for name in SORT_COLUMNS
+        }
+        return index
+
+    def to_arrays(self):
+        """Return {name: array} for the ratings and every sort order"""
+        arrays = {'ratings': self.ratings}
+        for name, order in self.sorts.items():
+            for field in SortOrder.ARRAYS:
+                arrays[f'{name}.{field}'] = getattr(order, field)
+        return arrays
+
+    @classmethod
+    def _filter_postings(cls, dataset):
+        postings = {}
+        for column in FILTER_COLUMNS:
+            if column not in dataset.df.columns:
+                postings[column] = {}
+                continue
+            # The chunked loader already builds city postings while streaming
+            postings[column] = dataset.derived(
+                column + '_postings', lambda d, column=column: cls._postings(d.df[column]))
+        return postings
+
+    @staticmethod
+    def _numeric(df, column):
+        if column not in df.columns:
+            return np.full(len(df), np.nan)
+        values = pd.to_numeric(df[column], errors='coerce')
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    @staticmethod
+    def _postings(series):
+        codes, uniques = pd.factorize(series)
+        valid = codes >= 0
+        # Normalize each distinct value once, then map rows through their codes
+        keys = np.array([normalize_value(value) for value in uniques], dtype=object)[codes[valid]]
+        positions = np.flatnonzero(valid)
+        groups = pd.Series(positions).groupby(keys, sort=False).indices
+        return {key: positions[idx] for key, idx in groups.items()}
+
+    def _candidates(self, state=None, **filters):
+        """Sorted row positions matching every posting-list filter, or None for all rows"""
+        lists = []
+        if state:
+            lists.append(self.dataset.state_index.positions(state))
+        for column, value in filters.items():
+            if value:
+                lists.append(self.postings[column].get(normalize_value(value),
+                                                       np.empty(0, dtype=np.intp)))
+        if not lists:
+            return None
+        lists.sort(key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def query(self, state=None, city=None, category=None, type=None,
+              min_rating=None, sort='default', cursor=None, limit=DEFAULT_LIMIT):
+        """Return (positions, next_cursor, total) for one page of listings"""
+        if sort not in self.sorts:
+            raise ListingQueryError(f"sort must be one of: {', '.join(self.sorts)}")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        order = self.sorts[sort]
+        start = 0 if cursor is None else order.start_after(*decode_cursor(cursor, sort))
+
+        candidates = self._candidates(state, city=city, category=category, type=type)
+        if candidates is None:
+            page, total = self._walk(order, start, limit, min_rating)
+        else:
+            if min_rating is not None:
+                candidates = candidates[self.ratings[candidates] >= min_rating]
+            total = len(candidates)
+            ranks = order.rank[candidates]
+            ranks = ranks[ranks >= start]
+            if len(ranks) > limit + 1:
+                ranks = ranks[np.argpartition(ranks, limit)[:limit + 1]]
+            page = order.permutation[np.sort(ranks)]
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = order.cursor_for(page[-1])
+        return page, next_cursor, total
+
+    def iter_positions(self, state=None, city=None, category=None, type=None,
+                       min_rating=None, sort='default', chunk=1000):
+        """
+        Return an iterator over every matching row position in sort order,
+        ``chunk`` positions at a time (for exports).
+
+        Arguments are checked before the iterator is returned. Without
+        filters the sort permutation is walked lazily; with filters only
+        the matching positions are held.
+        """
+        if sort not in self.sorts:
+            raise ListingQueryError(f"sort must be one of: {', '.join(self.sorts)}")
+        order = self.sorts[sort]
+        candidates = self._candidates(state, city=city, category=category, type=type)
+        if candidates is None:
+            return self._iter_all(order, min_rating, chunk)
+        if min_rating is not None:
+            candidates = candidates[self.ratings[candidates] >= min_rating]
+        matches = order.permutation[np.sort(order.rank[candidates])]
+        return (matches[start:start + chunk] for start in range(0, len(matches), chunk))
+
+    def _iter_all(self, order, min_rating, chunk):
+        for start in range(0, self.n_rows, chunk):
+            rows = order.permutation[start:start + chunk]
+            if min_rating is not None:
+                rows = rows[self.ratings[rows] >= min_rating]
+            if len(rows):
+                yield rows
+
+    def _walk(self, order, start, limit, min_rating):
+        """Page through the sort permutation directly (no posting filters)"""
+        if min_rating is None:
+            return order.permutation[start:start + limit + 1], self.n_rows
+
+        total = int(np.count_nonzero(self.ratings >= min_rating))
+        if order.name == 'rating':
+            # Ratings are sorted descending: matching rows form a prefix
+            return order.permutation[start:min(start + limit + 1, total)], total
+
+        page = []
+        chunk = max(limit * 4, 256)
+        while start < self.n_rows and len(page) <= limit:
+            rows = order.permutation[start:start + chunk]
+            page.extend(rows[self.ratings[rows] >= min_rating].tolist())
+            start += chunk
+        return np.array(page[:limit + 1], dtype=np.intp), total
+
+    def records(self, positions):
+        """JSON-ready records for ``positions`` (missing values become None)"""
+        return json_records(self.dataset.df, positions)
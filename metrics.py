@@ -0,0 +1,207 @@
+"""
+Request timing spans, Server-Timing headers and Prometheus metrics.
+
+Hot paths are wrapped in ``span(name)``:
+
+- ``data_load``   reading the CSV or snapshot
+- ``build_<name>`` building a derived index (listings, search, ...)
+- ``records``     selecting and converting rows for a state page
+- ``filter`` / ``search`` running a listings or search query
+- ``serialize``   turning rows into JSON-ready records
+- ``render``      Jinja template rendering (timed via Flask's signals)
+- ``compress``    response compression in http_cache
+
+Each span is observed into the ``llc_span_seconds`` histogram and, inside
+a request, reported back to the client in a ``Server-Timing`` header
+together with the request's ``total``. ``Metrics`` also counts requests per
+endpoint and serves everything at ``/metrics`` in the Prometheus text
+format.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, before_render_template, g, has_request_context, request, \
+    template_rendered
+
+# Seconds; suits anything from a cached page to a cold CSV load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    """Prometheus histogram with a fixed label set"""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (+Inf last), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), key + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+    def count(self, **labels):
+        """Observations recorded for ``labels``"""
+        series = self._series.get(tuple(labels[name] for name in self.labels))
+        return series[2] if series else 0
+
+
+class Registry:
+    """Collection of histograms rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Spans recorded on a work-pool thread, handed back to the waiting request
+_collector = threading.local()
+
+REGISTRY = Registry()
+SPAN_SECONDS = REGISTRY.histogram(
+    'llc_span_seconds', 'Time spent in instrumented code paths', ('span',))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'llc_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method', 'status'))
+
+
+def record_span(name, seconds):
+    """Observe a finished span and attach it to the current request"""
+    SPAN_SECONDS.observe(seconds, span=name)
+    collected = getattr(_collector, 'spans', None)
+    if collected is not None:
+        collected.append((name, seconds))
+    elif has_request_context():
+        g.setdefault('spans', []).append((name, seconds))
+
+
+def collect_spans(func):
+    """Wrap ``func`` to return ``(result, spans recorded while it ran)``"""
+    def wrapper():
+        outer = getattr(_collector, 'spans', None)
+        _collector.spans = []
+        try:
+            return func(), _collector.spans
+        finally:
+            _collector.spans = outer
+    return wrapper
+
+
+def add_spans(spans):
+    """Attach spans collected elsewhere to the current request"""
+    if has_request_context():
+        g.setdefault('spans', []).extend(spans)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as span ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def server_timing(spans, total):
+    """Server-Timing header value; repeated spans are summed"""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in totals.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class Metrics:
+    """Request timing, Server-Timing header and the /metrics endpoint"""
+
+    def __init__(self, app=None, registry=REGISTRY):
+        self.registry = registry
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def _start(self):
+        g.request_started = time.perf_counter()
+
+    def _finish(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        REQUEST_SECONDS.observe(total, endpoint=request.endpoint or 'unmatched',
+                                method=request.method, status=response.status_code)
+        response.headers['Server-Timing'] = server_timing(g.get('spans', []), total)
+        return response
+
+    @staticmethod
+    def _render_started(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    @staticmethod
+    def _render_finished(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            record_span('render', time.perf_counter() - started)
+
+    def view(self):
+        """Prometheus scrape endpoint"""
+        return Response(self.registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
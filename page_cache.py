@@ -0,0 +1,187 @@
+"""
+Rendered-page cache for the data-driven HTML routes.
+
+Pages are keyed by view name, view arguments and a content version (the
+dataset version plus a hash of the static service dicts). When the version
+changes every entry is dropped, so a CSV reload invalidates the cache
+without any explicit hook. Entries hold the HTML and a gzip copy, and are
+evicted least-recently-used once the total size passes ``max_bytes``.
+
+With a ``refresh`` callable the previous version's entries are kept for
+``stale_ttl`` seconds. A miss that has one is answered with it right away
+while ``refresh`` renders the new page in the background
+(stale-while-revalidate), so a reload does not make visitors wait.
+"""
+
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import Response, request
+
+# Default memory budget for cached bodies (plain + gzip)
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class CachedPage:
+    """One rendered page and its compressed variant"""
+
+    def __init__(self, body, version):
+        self.body = body.encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = hashlib.sha1(version.encode('utf-8') + self.body).hexdigest()[:20]
+        self.last_modified = time.time()
+        self.size = len(self.body) + len(self.gzip_body)
+
+    def to_response(self, max_age):
+        """Build a conditional response, gzip-encoded when the client allows"""
+        use_gzip = 'gzip' in request.accept_encodings
+        body = self.gzip_body if use_gzip else self.body
+        response = Response(body, mimetype='text/html')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.set_etag(self.etag + ('-gzip' if use_gzip else ''))
+        response.last_modified = self.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+
+class PageCache:
+    """Bounded LRU of rendered pages keyed by route, arguments and version"""
+
+    def __init__(self, version_func, max_bytes=DEFAULT_MAX_BYTES, max_age=300, render=None,
+                 refresh=None, stale_ttl=300):
+        self.version_func = version_func
+        # render(key, func) produces a page on a miss; lets the app offload it
+        self.render = render or (lambda key, func: func())
+        # refresh(key, func) runs func in the background while a stale page is served
+        self.refresh = refresh
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._stale = {}
+        self._stale_until = 0.0
+        self._version = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """Return the cached page for ``key`` or None"""
+        with self._lock:
+            if version != self._version:
+                # New dataset/content generation: everything cached is stale
+                self._stale = self._entries if self.refresh is not None else {}
+                self._stale_until = time.time() + self.stale_ttl
+                self._entries = OrderedDict()
+                self.bytes = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, version):
+        """Store a rendered page and return its CachedPage"""
+        entry = CachedPage(body, version)
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            if version != self._version:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def get_stale(self, key):
+        """Previous version's page for ``key`` while it may still be served, or None"""
+        if getattr(self._local, 'fresh_only', False):
+            return None
+        with self._lock:
+            if not self._stale:
+                return None
+            if time.time() > self._stale_until:
+                self._stale = {}
+                return None
+            entry = self._stale.get(key)
+            if entry is not None:
+                self.stale_hits += 1
+            return entry
+
+    @contextmanager
+    def fresh_only(self):
+        """Render misses in this thread instead of serving stale pages (cache warming)"""
+        self._local.fresh_only = True
+        try:
+            yield
+        finally:
+            self._local.fresh_only = False
+
+    def _fill(self, key, version, func):
+        body = func()
+        if isinstance(body, str):
+            self.put(key, body, version)
+        return body
+
+    def cached(self, view):
+        """Decorator caching a view that returns rendered HTML"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = self.version_func()
+            key = (view.__name__, args, tuple(sorted(kwargs.items())))
+            entry = self.get(key, version)
+            if entry is None:
+                call = functools.partial(view, *args, **kwargs)
+                stale = self.get_stale(key)
+                if stale is not None:
+                    self.refresh(key + (version,),
+                                 functools.partial(self._fill, key, version, call))
+                    return stale.to_response(self.max_age)
+                body = self.render(key + (version,), call)
+                if not isinstance(body, str):
+                    return body
+                entry = self.put(key, body, version)
+            return entry.to_response(self.max_age)
+        return wrapper
+
+    def clear(self):
+        """Drop every cached page"""
+        with self._lock:
+            self._entries.clear()
+            self._stale = {}
+            self.bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_hits': self.stale_hits,
+                'stale_entries': len(self._stale),
+                'evictions': self.evictions,
+            }
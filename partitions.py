@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Per-state partitions of "LLC Data.csv" with a small catalog.
+
+``python partitions.py`` splits the CSV into ``LLC Data.partitions/``:
+
+- ``catalog.json``  version, row count, state list, state counts and the
+                    data summary, plus one entry per partition with the
+                    state's service page preview (see Dataset.state_preview)
+- ``p<n>/``         one canonical state's rows in the snapshot layout (see
+                    snapshot.py) plus ``rows.npy``, their positions in the CSV
+
+Rows without a state go to a partition with no key; they are only read
+when the whole dataset is needed.
+
+With ``PARTITIONED_DATA=1`` the app opens the catalog instead of the CSV.
+``/api/states``, ``/api/data-summary``, the state lists and the service
+pages come from the catalog alone. A state page loads only its own state's partition, and loaded partitions are kept in an LRU capped at ``PARTITION_CACHE_MB``.
+Routes that need every row (listings, search) assemble the full frame from
+all partitions on first use. Serverless instances that answer a handful of
+state pages therefore read a small part of the data.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import geo
+import snapshot
+
+PARTITIONS_SUFFIX = '.partitions'
+CATALOG_FILE = 'catalog.json'
+ROWS_FILE = 'rows.npy'
+FORMAT_VERSION = 3
+
+DEFAULT_CACHE_BYTES = int(os.environ.get('PARTITION_CACHE_MB', '256')) * 1024 * 1024
+
+
+def partitions_dir_for(csv_path):
+    """Directory holding the partitions for ``csv_path``"""
+    return os.path.splitext(csv_path)[0] + PARTITIONS_SUFFIX
+
+
+def catalog_path_for(csv_path):
+    """Path of the partition catalog for ``csv_path``"""
+    return os.path.join(partitions_dir_for(csv_path), CATALOG_FILE)
+
+
+def _write_partition(directory, name, key, df, positions, csv_path, version):
+    from data_store import Dataset, StateIndex
+
+    part = df.take(positions).reset_index(drop=True)
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    state_index = StateIndex(part['state'] if 'state' in part.columns else None)
+    snapshot.write_columns(path, part, state_index, csv_path, version=version)
+    np.save(os.path.join(path, ROWS_FILE), np.asarray(positions, dtype=np.int64))
+    entry = {'key': key, 'dir': name, 'rows': len(part)}
+    if key is not None:
+        entry['preview'] = Dataset(part, state_index=state_index,
+                                   version=version).state_preview(state_index.states[0])
+    return entry
+
+
+def write_partitions(csv_path):
+    """Split ``csv_path`` into per-state partitions and return the directory"""
+    from data_store import Aggregates
+    from ingest import load_csv_chunked
+
+    df, state_index, _ = load_csv_chunked(csv_path)
+    version = snapshot.file_sha1(csv_path)[:16]
+    target = partitions_dir_for(csv_path)
+    tmp_dir = '%s.tmp-%d' % (target, os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    entries = []
+    assigned = np.zeros(len(df), dtype=bool)
+    for n, (key, positions) in enumerate(sorted(state_index.groups())):
+        entries.append(_write_partition(tmp_dir, 'p%d' % n, key, df, positions, csv_path, version))
+        assigned[positions] = True
+    unassigned = np.flatnonzero(~assigned)
+    if len(unassigned):
+        entries.append(_write_partition(tmp_dir, 'p%d' % len(entries), None, df, unassigned,
+                                        csv_path, version))
+
+    aggregates = Aggregates(df)
+    catalog = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'source_size': os.path.getsize(csv_path),
+        'rows': len(df),
+        'columns': list(df.columns),
+        'states': state_index.states,
+        'state_counts': aggregates.state_counts,
+        'unique_cities': aggregates.unique_cities,
+        'top_cities': aggregates.top_cities,
+        'partitions': entries,
+    }
+    # Written last: a directory without it is never opened
+    with open(os.path.join(tmp_dir, CATALOG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    snapshot.replace_dir(tmp_dir, target)
+    return target
+
+
+class Partition:
+    """One loaded partition: a Dataset over its rows plus their CSV positions"""
+
+    def __init__(self, directory, signature, version):
+        from data_store import Dataset
+
+        df, state_index, _ = snapshot.read_columns(directory)
+        self.dataset = Dataset(df, signature, state_index=state_index, version=version,
+                               source='partitions')
+        self.rows = np.load(os.path.join(directory, ROWS_FILE), mmap_mode='r')
+        self.nbytes = int(df.memory_usage(deep=True).sum()) + self.rows.nbytes
+        self._summary = None
+
+    def summary(self):
+        """(rating sum, rating count, phone count, city count) over every row"""
+        if self._summary is None:
+            import pandas as pd
+
+            df = self.dataset.df
+            rating_sum, rating_count, phones, cities = 0.0, 0, 0, 0
+            if 'rating' in df.columns:
+                ratings = pd.to_numeric(df['rating'], errors='coerce')
+                rating_sum, rating_count = float(ratings.sum()), int(ratings.count())
+            if 'phone' in df.columns:
+                phones = int(df['phone'].notna().sum())
+            if 'city' in df.columns:
+                cities = int(df['city'].nunique())
+            self._summary = (rating_sum, rating_count, phones, cities)
+        return self._summary
+
+
+class PartitionCache:
+    """Process-wide LRU of loaded partitions under a memory cap"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes loads so concurrent requests for a state read it once
+        self._load_lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        """Return the partition cached under ``key``, calling ``loader()`` on a miss"""
+        with self._lock:
+            partition = self._entries.get(key)
+            if partition is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return partition
+
+        with self._load_lock:
+            with self._lock:
+                partition = self._entries.get(key)
+                if partition is not None:
+                    self.hits += 1
+                    return partition
+                self.misses += 1
+            partition = loader()
+            with self._lock:
+                self._entries[key] = partition
+                self.bytes += partition.nbytes
+                # Always keep the partition just loaded, even if it alone is over the cap
+                while self.bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= evicted.nbytes
+                    self.evictions += 1
+        return partition
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+# Shared by every PartitionedDataset in the process
+partition_cache = PartitionCache()
+
+
+class PartitionedDataset:
+    """
+    Dataset interface over a partition catalog.
+
+    Counts and state lists come from the catalog. A state lookup resolves
+    the canonical key (see geo.py) and loads only that state's partition. ``df`` and ``derived`` load every partition
+    into one full Dataset the first time they are used.
+    """
+
+    def __init__(self, directory, catalog, signature, cache=partition_cache):
+        from data_store import Aggregates
+
+        self.directory = directory
+        self.catalog = catalog
+        self.signature = signature
+        self.version = catalog['version']
+        self.source = 'partitions'
+        self.cache = cache
+        self.states = catalog['states']
+        self.aggregates = Aggregates.from_counts(
+            catalog['rows'], catalog['state_counts'], catalog['top_cities'],
+            catalog['unique_cities'])
+        self._entries = {entry['key']: entry for entry in catalog['partitions']
+                         if entry['key'] is not None}
+        self._labels = None
+        self._full = None
+        self._lock = threading.Lock()
+
+    @property
+    def empty(self):
+        return self.catalog['rows'] == 0
+
+    def canonical_state(self, state):
+        """Canonical spelling of ``state`` (see StateIndex.canonical), or None"""
+        if self._labels is None:
+            self._labels = {geo.state_key(label): label for label in self.states}
+        key = geo.state_key(state)
+        return self._labels.get(key) if key in self._entries else None
+
+    def partition(self, key):
+        """Loaded partition for state key ``key``"""
+        path = os.path.join(self.directory, self._entries[key]['dir'])
+        return self.cache.get((path, self.version),
+                              lambda: Partition(path, self.signature, self.version))
+
+    def _state_partition(self, state):
+        key = geo.state_key(state)
+        return self.partition(key).dataset if key in self._entries else None
+
+    def state_records(self, state, limit=None, offset=0):
+        """Return ready-to-render records for ``state`` in file order"""
+        dataset = self._state_partition(state)
+        return dataset.state_records(state, limit, offset) if dataset is not None else []
+
+    def cities(self, state):
+        """Cities of ``state`` with counts, from its partition (see CityIndex)"""
+        dataset = self._state_partition(state)
+        return dataset.cities(state) if dataset is not None else []
+
+    def canonical_city(self, state, city):
+        """Canonical spelling of ``city`` within ``state``, or None"""
+        dataset = self._state_partition(state)
+        return dataset.canonical_city(state, city) if dataset is not None else None
+
+    def city_records(self, state, city, limit=None, offset=0):
+        """Return ready-to-render records for ``city`` in ``state``"""
+        dataset = self._state_partition(state)
+        return dataset.city_records(state, city, limit, offset) if dataset is not None else []
+
+    def state_preview(self, state):
+        """Service page card for ``state``, from the catalog (see Dataset.state_preview)"""
+        entry = self._entries.get(geo.state_key(state))
+        if entry is None:
+            return {'services': 0, 'types': [], 'cities': []}
+        return entry['preview']
+
+    def state_stats(self, state):
+        """Same figures as StateStats.for_state, from the state's partition"""
+        key = geo.state_key(state)
+        if key not in self._entries:
+            return {'services': 0, 'avg_rating': 0.0, 'city_count': 0, 'phone_count': 0}
+        rating_sum, rating_count, phone_count, city_count = self.partition(key).summary()
+        return {
+            'services': self._entries[key]['rows'],
+            'avg_rating': rating_sum / rating_count if rating_count else 0.0,
+            'city_count': city_count,
+            'phone_count': phone_count,
+        }
+
+    def full(self):
+        """Every partition reassembled, in CSV order, as one Dataset"""
+        if self._full is None:
+            with self._lock:
+                if self._full is None:
+                    self._full = self._load_full()
+        return self._full
+
+    def _load_full(self):
+        from data_store import Dataset, StateIndex
+        from ingest import concat_chunks
+
+        frames, rows = [], []
+        for entry in self.catalog['partitions']:
+            path = os.path.join(self.directory, entry['dir'])
+            df, _, _ = snapshot.read_columns(path)
+            frames.append(df)
+            rows.append(np.load(os.path.join(path, ROWS_FILE)))
+        df = concat_chunks(frames, self.catalog['columns'])
+        df = df.take(np.argsort(np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)))
+        df = df.reset_index(drop=True)
+        # Back in CSV order, each partition's rows.npy are its state's positions
+        state_index = StateIndex.from_positions(
+            self.states, {entry['key']: part_rows
+                          for entry, part_rows in zip(self.catalog['partitions'], rows)
+                          if entry['key'] is not None})
+        return Dataset(df, self.signature, state_index=state_index, version=self.version,
+                       source='partitions')
+
+    @property
+    def df(self):
+        return self.full().df
+
+    def derived(self, name, builder):
+        """Indexes over the whole dataset are built on the full Dataset"""
+        return self.full().derived(name, builder)
+
+
+def open_partitions(csv_path, signature):
+    """
+    Open the partition catalog for ``csv_path``.
+
+    Raises ``ValueError`` when the catalog is from another format or no
+    longer matches the CSV size.
+    """
+    directory = partitions_dir_for(csv_path)
+    with open(os.path.join(directory, CATALOG_FILE), encoding='utf-8') as f:
+        catalog = json.load(f)
+    if catalog.get('format') != FORMAT_VERSION:
+        raise ValueError(f"unsupported partition format {catalog.get('format')}")
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) != catalog['source_size']:
+        raise ValueError("partitions do not match the CSV size")
+    return PartitionedDataset(directory, catalog, signature)
+
+
+def main(argv=None):
+    """Partition the CSV given on the command line (or the default path)"""
+    argv = sys.argv[1:] if argv is None else argv
+    csv_path = argv[0] if argv else "LLC Data.csv"
+    if not os.path.exists(csv_path):
+        print(f"CSV file not found: {csv_path}")
+        return 1
+    target = write_partitions(csv_path)
+    with open(os.path.join(target, CATALOG_FILE), encoding='utf-8') as f:
+        catalog = json.load(f)
+    print(f"Wrote {len(catalog['partitions'])} partitions "
+          f"({catalog['rows']} rows) for {csv_path} to {target}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+Disabled unless ``PROFILING=1`` is set. Then a request is profiled when
+it carries ``?_profile=1`` or is picked at random with probability
+``PROFILE_SAMPLE_RATE``. While it runs, a background thread samples the
+request thread's stack every ``PROFILE_INTERVAL`` seconds, together with
+the stack of any work pool thread running a job for it (``follow``). When the
+request finishes the stacks are written in the folded format that
+flamegraph.pl, speedscope and inferno read::
+
+    app.py:service_state_page;data_store.py:state_records;... 12
+
+Files go to ``PROFILE_DIR`` (default ``profiles/``), one per request, and
+the file name is returned in the ``X-Profile`` response header.
+"""
+
+import functools
+import os
+import random
+import sys
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+DEFAULT_INTERVAL = 0.001
+DEFAULT_PROFILE_DIR = 'profiles'
+
+
+def fold_stack(frame):
+    """``file:function`` names from the outermost frame to ``frame``, joined by ';'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's stack, and those of threads working for it, on a background thread"""
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        # Threads currently running a followed function
+        self.helpers = set()
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def follow(self, func):
+        """Wrap ``func`` so the thread that runs it is sampled while it does"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ident = threading.get_ident()
+            if ident == self.thread_id:
+                return func(*args, **kwargs)
+            self.helpers.add(ident)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.helpers.discard(ident)
+        return wrapper
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id not in frames:
+                break
+            for thread_id in (self.thread_id, *self.helpers):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = fold_stack(frame)
+                    self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def folded(self):
+        """Samples in folded-stack format, most frequent first"""
+        return ''.join(f'{stack} {count}\n' for stack, count in
+                       sorted(self.samples.items(), key=lambda item: -item[1]))
+
+
+class Profiler:
+    """Flask hooks that profile selected requests"""
+
+    def __init__(self, app=None):
+        self.enabled = os.environ.get('PROFILING') == '1'
+        self.sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+        self.interval = float(os.environ.get('PROFILE_INTERVAL', DEFAULT_INTERVAL))
+        self.profile_dir = os.environ.get('PROFILE_DIR', DEFAULT_PROFILE_DIR)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def wants_profile(self):
+        if not self.enabled:
+            return False
+        if request.args.get('_profile') == '1':
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def follow(self, func):
+        """``func`` wrapped so a profiled request also samples the thread running it"""
+        sampler = g.get('profiler') if has_app_context() else None
+        return func if sampler is None else sampler.follow(func)
+
+    def _start(self):
+        if self.wants_profile():
+            g.profiler = StackSampler(threading.get_ident(), self.interval).start()
+
+    def _finish(self, response):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return response
+        sampler.stop()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        endpoint = request.endpoint or 'unmatched'
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{threading.get_ident()}.folded'
+        with open(os.path.join(self.profile_dir, name), 'w', encoding='utf-8') as f:
+            f.write(sampler.folded())
+        response.headers['X-Profile'] = name
+        return response
+
+    def _teardown(self, exc):
+        # The view raised before after_request ran: just stop sampling
+        sampler = g.pop('profiler', None)
+        if sampler is not None:
+            sampler.stop()
@@ -0,0 +1,299 @@
+"""
+In-process full-text search over the business listings.
+
+``SearchIndex`` is an inverted index over name, description, city,
+category and type. Field matches are weighted (a hit in the name counts
+more than one in the description) and results are ranked with BM25. The
+last query term is also matched as a prefix, which is what the search box
+needs for typeahead.
+
+The index is built on the first search after each dataset load. When the
+previous generation had an index (handed over by ``Dataset.derived``),
+rows whose searchable text is unchanged keep their postings (remapped to
+their new row positions); only new or edited rows are tokenized again.
+Rows are matched by a BLAKE2b digest of their text, which is stable
+across processes, so indexes from a shared generation can be reused too.
+
+Queries run under a time budget: terms are scored rarest first and scoring
+stops when the budget is spent, with the response marked ``partial``.
+"""
+
+import bisect
+import hashlib
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+# Searchable columns and how much a term occurrence in each one counts
+FIELD_WEIGHTS = {
+    'name': 3,
+    'city': 2,
+    'category': 2,
+    'type': 1,
+    'description': 1,
+}
+
+TOKEN_RE = re.compile(r'\w+')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Per-query latency budget
+BUDGET_SECONDS = 0.05
+# Terms a trailing prefix may expand to
+MAX_PREFIX_TERMS = 50
+# Query length cap, in terms
+MAX_QUERY_TERMS = 8
+
+
+def tokenize(text):
+    """Lowercase word tokens of ``text``"""
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _field_tokens(df):
+    """Per-field lists of token lists, one entry per row"""
+    n_rows = len(df)
+    tokens = {}
+    for field in FIELD_WEIGHTS:
+        if field in df.columns:
+            text = df[field].astype(object).where(df[field].notna(), '').astype(str).str.lower()
+            tokens[field] = text.str.findall(TOKEN_RE).tolist()
+        else:
+            tokens[field] = [[]] * n_rows
+    return tokens
+
+
+def _row_keys(df):
+    """64-bit digest of each row's searchable text, used to spot unchanged rows"""
+    parts = []
+    for field in FIELD_WEIGHTS:
+        if field in df.columns:
+            parts.append(df[field].astype(object).where(df[field].notna(), '').astype(str))
+        else:
+            parts.append(pd.Series([''] * len(df), index=df.index))
+    combined = parts[0].str.cat(parts[1:], sep='\x1f') if len(df) else parts[0]
+    digests = b''.join(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+                       for text in combined)
+    return np.frombuffer(digests, dtype='<i8').astype(np.int64)
+
+
+class PackedPostings:
+    """Read-only term -> (positions, freqs) mapping over back-to-back arrays"""
+
+    def __init__(self, terms, offsets, positions, freqs):
+        self._ids = {term: i for i, term in enumerate(terms)}
+        self._offsets = offsets
+        self._positions = positions
+        self._freqs = freqs
+
+    def __getitem__(self, term):
+        i = self._ids[term]
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return self._positions[lo:hi], self._freqs[lo:hi]
+
+    def __contains__(self, term):
+        return term in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def items(self):
+        for term in self._ids:
+            yield term, self[term]
+
+
+class SearchIndex:
+    """Inverted index with BM25 scoring for one dataset generation"""
+
+    def __init__(self, n_docs, doc_lengths, postings, row_keys, terms=None):
+        self.n_docs = n_docs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # term -> (sorted row positions, weighted term frequencies)
+        self.postings = postings
+        self.terms = sorted(postings) if terms is None else terms
+        self.row_keys = row_keys
+        self.reused_rows = 0
+
+    @classmethod
+    def from_arrays(cls, terms, arrays):
+        """Rebuild an index saved with ``to_arrays()``; postings are sliced on lookup"""
+        postings = PackedPostings(terms, arrays['offsets'], arrays['positions'], arrays['freqs'])
+        return cls(len(arrays['doc_lengths']), arrays['doc_lengths'], postings,
+                   arrays['row_keys'], terms=terms)
+
+    def to_arrays(self):
+        """Return (terms, {name: array}) with the postings laid out back to back"""
+        terms = self.terms
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms])
+        if terms:
+            positions = np.concatenate([self.postings[term][0] for term in terms])
+            freqs = np.concatenate([self.postings[term][1] for term in terms])
+        else:
+            positions = np.empty(0, dtype=np.int64)
+            freqs = np.empty(0, dtype=np.float64)
+        return terms, {
+            'offsets': offsets,
+            'positions': positions,
+            'freqs': freqs,
+            'doc_lengths': self.doc_lengths,
+            'row_keys': self.row_keys,
+        }
+
+    @classmethod
+    def build(cls, df, previous=None):
+        """Build an index for ``df``, reusing ``previous`` where rows are unchanged"""
+        n_rows = len(df)
+        row_keys = _row_keys(df)
+        doc_lengths = np.zeros(n_rows, dtype=np.float64)
+
+        chunks = {}
+        if previous is not None and previous.n_docs:
+            old_to_new = cls._match_rows(previous.row_keys, row_keys)
+            kept = old_to_new >= 0
+            doc_lengths[old_to_new[kept]] = previous.doc_lengths[kept]
+            for term, (positions, freqs) in previous.postings.items():
+                new_positions = old_to_new[positions]
+                keep = new_positions >= 0
+                if keep.any():
+                    chunks[term] = [(new_positions[keep], freqs[keep])]
+            changed = np.ones(n_rows, dtype=bool)
+            changed[old_to_new[kept]] = False
+            changed_rows = np.flatnonzero(changed)
+            reused = int(kept.sum())
+        else:
+            changed_rows = np.arange(n_rows)
+            reused = 0
+
+        if len(changed_rows):
+            fresh = cls._tokenize_rows(df.iloc[changed_rows], changed_rows, doc_lengths)
+            for term, pair in fresh.items():
+                chunks.setdefault(term, []).append(pair)
+
+        postings = {}
+        for term, parts in chunks.items():
+            if len(parts) == 1:
+                positions, freqs = parts[0]
+            else:
+                positions = np.concatenate([p for p, _ in parts])
+                freqs = np.concatenate([f for _, f in parts])
+            order = np.argsort(positions, kind='stable')
+            postings[term] = (positions[order], freqs[order])
+
+        index = cls(n_rows, doc_lengths, postings, row_keys)
+        index.reused_rows = reused
+        return index
+
+    @staticmethod
+    def _match_rows(old_keys, new_keys):
+        """Map old row positions to new ones for rows with identical text (-1 if gone)"""
+        old = pd.DataFrame({'key': old_keys})
+        old['occurrence'] = old.groupby('key').cumcount()
+        old['old'] = np.arange(len(old_keys))
+        new = pd.DataFrame({'key': new_keys})
+        new['occurrence'] = new.groupby('key').cumcount()
+        new['new'] = np.arange(len(new_keys))
+        matched = old.merge(new, on=['key', 'occurrence'])
+        old_to_new = np.full(len(old_keys), -1, dtype=np.int64)
+        old_to_new[matched['old'].to_numpy()] = matched['new'].to_numpy()
+        return old_to_new
+
+    @staticmethod
+    def _tokenize_rows(frame, positions, doc_lengths):
+        """Tokenize ``frame`` (rows at ``positions``); returns term -> (positions, freqs)"""
+        tokens = _field_tokens(frame)
+        term_positions = {}
+        term_freqs = {}
+        for i, position in enumerate(positions.tolist()):
+            counts = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokens[field][i]:
+                    counts[token] = counts.get(token, 0) + weight
+            doc_lengths[position] = sum(counts.values())
+            for token, count in counts.items():
+                term_positions.setdefault(token, []).append(position)
+                term_freqs.setdefault(token, []).append(count)
+        return {
+            term: (np.array(term_positions[term], dtype=np.int64),
+                   np.array(term_freqs[term], dtype=np.float64))
+            for term in term_positions
+        }
+
+    def expand_prefix(self, prefix, limit=MAX_PREFIX_TERMS):
+        """Indexed terms starting with ``prefix``, most frequent first"""
+        i = bisect.bisect_left(self.terms, prefix)
+        matches = []
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            matches.append(self.terms[i])
+            i += 1
+        matches.sort(key=lambda term: -len(self.postings[term][0]))
+        return matches[:limit]
+
+    def search(self, query, limit=DEFAULT_LIMIT, prefix=True, budget=BUDGET_SECONDS):
+        """
+        Return (positions, scores, partial) for the best matches of ``query``.
+
+        With ``prefix`` the last query term also matches indexed terms that
+        start with it.
+        """
+        deadline = time.perf_counter() + budget
+        words = tokenize(query)[:MAX_QUERY_TERMS]
+        if not words or not self.n_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0), False
+
+        groups = [[word] for word in words]
+        if prefix:
+            groups[-1] = self.expand_prefix(words[-1]) or [words[-1]]
+        terms = {term for group in groups for term in group if term in self.postings}
+        # Rarest (most informative) terms first, so a cut-off keeps the best signal
+        terms = sorted(terms, key=lambda term: len(self.postings[term][0]))
+
+        positions_parts = []
+        score_parts = []
+        partial = False
+        for term in terms:
+            if time.perf_counter() > deadline:
+                partial = True
+                break
+            positions, freqs = self.postings[term]
+            df = len(positions)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * self.doc_lengths[positions] / (self.avg_length or 1))
+            positions_parts.append(positions)
+            score_parts.append(idf * freqs * (K1 + 1) / (freqs + norm))
+
+        if not positions_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0), partial
+
+        positions = np.concatenate(positions_parts)
+        scores = np.concatenate(score_parts)
+        docs, inverse = np.unique(positions, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        if len(docs) > limit:
+            top = np.argpartition(-totals, limit)[:limit]
+        else:
+            top = np.arange(len(docs))
+        # Best score first, ties in file order
+        top = top[np.lexsort((docs[top], -totals[top]))]
+        return docs[top], totals[top], partial
+
+
+def build_search_index(dataset, previous=None):
+    """Dataset.derived() builder: incremental over the previous generation's index"""
+    started = time.perf_counter()
+    index = SearchIndex.build(dataset.df, previous=previous)
+    print(f"Built search index over {index.n_docs} rows "
+          f"({index.reused_rows} reused) in {time.perf_counter() - started:.2f}s")
+    return index
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Shared, memory-mapped dataset generations for multi-worker servers.
+
+Under a pre-fork server every worker normally parses "LLC Data.csv" and
+builds its own indexes, so memory and load time grow with the worker
+count. With ``SHARED_DATASET=1`` one process publishes a *generation*,
+which is the columns and every index written as ``.npy`` files. Each
+worker memory-maps that generation read-only. The operating system keeps
+a single copy of those pages however many workers attach:
+
+- numeric columns, the codes of every text column, the state index, the
+  listing sort orders and posting lists, and the search postings are
+  shared and zero-copy;
+- each worker still holds the distinct values of each text column (the
+  categorical categories) and the search term list.
+
+Layout, next to the CSV::
+
+    LLC Data.shared/
+        CURRENT                 name of the live generation
+        .lock                   held while a generation is published
+        g<time_ns>-<version>/   snapshot columns (see snapshot.py) plus
+                                <column>_postings.*, listings.*, search.*,
+                                and generation.json (written last)
+
+A new generation is built in a temporary directory, renamed into place
+and then made live by atomically replacing ``CURRENT``. Workers notice
+the change on their next request and switch, never seeing a half-written
+generation. When the CSV changes, the first worker to notice publishes
+in a background thread while every worker keeps serving the previous
+generation. ``python shared_dataset.py --watch 10`` runs a dedicated
+publisher instead. Old generations are pruned; workers that still map
+them keep working because unlinked files stay readable while mapped.
+Staging directories left by a publisher that died mid-build are removed
+by the next publish.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+import snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishes are not serialized across processes
+    fcntl = None
+
+SHARED_SUFFIX = '.shared'
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+GENERATION_FILE = 'generation.json'
+# Generations kept on disk besides the live one
+KEEP_GENERATIONS = 2
+
+_generation_info = {}
+_publishing = threading.Lock()
+
+
+def shared_dir_for(csv_path):
+    """Directory holding the generations for ``csv_path``"""
+    return os.path.splitext(csv_path)[0] + SHARED_SUFFIX
+
+
+def current_generation(csv_path):
+    """Path of the live generation for ``csv_path``, or None"""
+    shared_dir = shared_dir_for(csv_path)
+    try:
+        with open(os.path.join(shared_dir, CURRENT_FILE), encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    generation = os.path.join(shared_dir, name)
+    if not name or not os.path.exists(os.path.join(generation, GENERATION_FILE)):
+        return None
+    # Generations written in an older layout are treated as missing and rebuilt
+    if generation_info(generation).get('format') != snapshot.FORMAT_VERSION:
+        return None
+    return generation
+
+
+def generation_info(generation):
+    """Contents of a generation's generation.json (immutable, so cached)"""
+    info = _generation_info.get(generation)
+    if info is None:
+        with open(os.path.join(generation, GENERATION_FILE), encoding='utf-8') as f:
+            info = _generation_info[generation] = json.load(f)
+    return info
+
+
+def is_stale(csv_path, generation):
+    """True when the CSV changed since ``generation`` was built from it"""
+    from data_store import file_signature
+
+    signature = file_signature(csv_path)
+    if signature is None:
+        # CSV removed: keep serving the last generation
+        return False
+    return list(signature[1:]) != generation_info(generation)['source']
+
+
+@contextlib.contextmanager
+def _publish_lock(shared_dir, blocking):
+    """Cross-process publish lock; yields False when ``blocking`` is off and it is taken"""
+    os.makedirs(shared_dir, exist_ok=True)
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(shared_dir, LOCK_FILE), 'a+') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _save_arrays(directory, prefix, arrays):
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{prefix}.{name}.npy'), np.asarray(array))
+
+
+def _load_arrays(directory, prefix, names):
+    # Plain ndarray views of the mappings: slicing np.memmap objects is much slower
+    return {name: np.load(os.path.join(directory, f'{prefix}.{name}.npy'),
+                          mmap_mode='r').view(np.ndarray)
+            for name in names}
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def build_generation(csv_path, directory):
+    """Parse ``csv_path`` and write its columns and indexes into ``directory``"""
+    import ingest
+    import search
+    from data_store import Dataset, file_signature
+    from listings import FILTER_COLUMNS, ListingIndex, postings_to_arrays
+
+    signature = file_signature(csv_path)
+    df, state_index, derived = ingest.load_csv_chunked(csv_path)
+    meta = snapshot.write_columns(directory, df, state_index, csv_path)
+    dataset = Dataset(df, ('csv',) + signature, state_index=state_index, derived=derived)
+
+    listing_index = dataset.derived('listings', ListingIndex)
+    postings = {}
+    for column in FILTER_COLUMNS:
+        keys, offsets, positions = postings_to_arrays(listing_index.postings[column])
+        _save_arrays(directory, f'{column}_postings', {'offsets': offsets, 'positions': positions})
+        postings[column] = keys
+    listing_arrays = listing_index.to_arrays()
+    _save_arrays(directory, 'listings', listing_arrays)
+
+    terms, search_arrays = dataset.derived('search', search.build_search_index).to_arrays()
+    _save_arrays(directory, 'search', search_arrays)
+
+    # Written last: a directory without it is never made live
+    _write_json(os.path.join(directory, GENERATION_FILE), {
+        'format': snapshot.FORMAT_VERSION,
+        'source': list(signature[1:]),
+        'version': meta['version'],
+        'built_at': time.time(),
+        'postings_keys': postings,
+        'listing_arrays': sorted(listing_arrays),
+        'search_terms': terms,
+        'search_arrays': sorted(search_arrays),
+    })
+
+
+def publish(csv_path, blocking=True):
+    """
+    Build a new generation for ``csv_path`` and make it live.
+
+    Returns the live generation's path, or None when ``blocking`` is off
+    and another process is already publishing.
+    """
+    shared_dir = shared_dir_for(csv_path)
+    with _publish_lock(shared_dir, blocking) as acquired:
+        if not acquired:
+            return None
+        _remove_abandoned(shared_dir)
+        # Another process may have published while we waited for the lock
+        current = current_generation(csv_path)
+        if current is not None and not is_stale(csv_path, current):
+            return current
+
+        started = time.perf_counter()
+        tmp_dir = os.path.join(shared_dir, '.tmp-%d' % os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            build_generation(csv_path, tmp_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        name = 'g%020d-%s' % (time.time_ns(), generation_info(tmp_dir)['version'])
+        _generation_info.pop(tmp_dir, None)
+        generation = os.path.join(shared_dir, name)
+        os.rename(tmp_dir, generation)
+
+        pointer = os.path.join(shared_dir, '%s.tmp-%d' % (CURRENT_FILE, os.getpid()))
+        with open(pointer, 'w', encoding='utf-8') as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(shared_dir, CURRENT_FILE))
+        print(f"Published shared dataset generation {name} "
+              f"in {time.perf_counter() - started:.2f}s")
+
+        _prune(shared_dir, keep=name)
+        return generation
+
+
+def _remove_abandoned(shared_dir):
+    """Remove staging files of publishes that died before finishing (lock held)"""
+    if fcntl is None:
+        return  # publishes are not serialized: another one may still be writing
+    for name in os.listdir(shared_dir):
+        if not (name.startswith('.tmp-') or name.startswith(CURRENT_FILE + '.tmp-')):
+            continue
+        path = os.path.join(shared_dir, name)
+        print(f"Removing abandoned shared dataset staging {name}")
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+
+def _prune(shared_dir, keep):
+    """Remove all but the newest KEEP_GENERATIONS generations besides ``keep``"""
+    names = sorted((name for name in os.listdir(shared_dir)
+                    if name.startswith('g') and name != keep), reverse=True)
+    for name in names[KEEP_GENERATIONS:]:
+        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+def publish_in_background(csv_path):
+    """Publish from a daemon thread unless this process is already publishing"""
+    if not _publishing.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            publish(csv_path, blocking=False)
+        except Exception as e:
+            print(f"Error publishing shared dataset for {csv_path}: {e}")
+        finally:
+            _publishing.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def locate(csv_path):
+    """
+    DatasetCache signature of the live generation for ``csv_path``.
+
+    Publishes the first generation synchronously; later CSV changes are
+    published in the background while the current generation is served.
+    Returns None when there is neither a generation nor a CSV.
+    """
+    from data_store import file_signature
+
+    generation = current_generation(csv_path)
+    if generation is None:
+        if file_signature(csv_path) is None:
+            return None
+        try:
+            generation = publish(csv_path)
+        except Exception as e:
+            print(f"Error publishing shared dataset for {csv_path}: {e}")
+            return None
+    elif is_stale(csv_path, generation):
+        publish_in_background(csv_path)
+    signature = file_signature(os.path.join(generation, GENERATION_FILE))
+    return ('shared', generation) + signature[1:]
+
+
+def load_generation(generation, signature):
+    """Attach to ``generation`` read-only and return a Dataset over it"""
+    from data_store import Dataset
+    from listings import ListingIndex, postings_from_arrays
+    from search import SearchIndex
+
+    info = generation_info(generation)
+    df, state_index, meta = snapshot.read_columns(generation, categorical_text=True)
+    derived = {}
+    for column, keys in info['postings_keys'].items():
+        arrays = _load_arrays(generation, f'{column}_postings', ('offsets', 'positions'))
+        derived[column + '_postings'] = postings_from_arrays(
+            keys, arrays['offsets'], arrays['positions'])
+    dataset = Dataset(df, signature, state_index=state_index, version=meta['version'],
+                      source='shared', derived=derived)
+
+    listing_arrays = _load_arrays(generation, 'listings', info['listing_arrays'])
+    dataset.derived('listings', lambda d: ListingIndex.from_arrays(d, listing_arrays))
+    search_arrays = _load_arrays(generation, 'search', info['search_arrays'])
+    dataset.derived('search', lambda d: SearchIndex.from_arrays(info['search_terms'], search_arrays))
+    return dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish shared dataset generations")
+    parser.add_argument('csv_path', nargs='?', default="LLC Data.csv")
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help="keep running and republish whenever the CSV changes")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.csv_path):
+        print(f"CSV file not found: {args.csv_path}")
+        return 1
+    generation = publish(args.csv_path)
+    print(f"Live generation: {generation}")
+    while args.watch:
+        time.sleep(args.watch)
+        current = current_generation(args.csv_path)
+        if current is None or is_stale(args.csv_path, current):
+            publish(args.csv_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
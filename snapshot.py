@@ -0,0 +1,243 @@
+"""
+Columnar binary snapshot of "LLC Data.csv".
+
+``python snapshot.py`` compiles the CSV into a ``LLC Data.snapshot/``
+directory next to it:
+
+- ``meta.json``          column layout, source size, version, state index keys
+- ``<n>.npy``            numeric columns, loaded with ``mmap_mode='r'``
+- ``<n>.mask.npy``       missing-value mask for nullable integer columns
+- ``<n>.codes.npy``      integer codes for text columns (also memory-mapped)
+- ``<n>.categories.json`` distinct values for each text column
+- ``state_positions.npy`` / ``state_offsets.npy`` prebuilt StateIndex
+
+Text columns are dictionary encoded, so loading them only creates each
+distinct string once. ``state``, ``city`` and ``category`` stay pandas
+categoricals; the other text columns are expanded back to object arrays
+with a single ``take``. Only NumPy is needed, so the snapshot works on
+the same dependencies as the rest of the app.
+
+The loader uses the snapshot when it is at least as new as the CSV (or
+the CSV is absent) and falls back to reading the CSV otherwise.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_SUFFIX = '.snapshot'
+META_FILE = 'meta.json'
+FORMAT_VERSION = 3
+
+# Text columns kept as pandas categoricals after loading (in addition to
+# any column that is already categorical when the snapshot is compiled)
+CATEGORICAL_COLUMNS = ('state', 'city', 'category')
+
+
+def snapshot_dir_for(csv_path):
+    """Return the snapshot directory that belongs to ``csv_path``"""
+    return os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+
+
+def meta_path_for(csv_path):
+    """Return the path of the snapshot's meta.json for ``csv_path``"""
+    return os.path.join(snapshot_dir_for(csv_path), META_FILE)
+
+
+def is_fresh(snapshot_signature, csv_signature):
+    """True when the snapshot should be preferred over the CSV"""
+    if snapshot_signature is None:
+        return False
+    if csv_signature is None:
+        return True
+    return snapshot_signature[1] >= csv_signature[1]
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    """Return the hex SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _codes_dtype(n_categories):
+    """Smallest code dtype pandas keeps without copying (see coerce_indexer_dtype)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def compile_snapshot(csv_path, df=None, state_index=None):
+    """Convert ``csv_path`` into a snapshot directory and return its path"""
+    from data_store import StateIndex
+    from ingest import load_csv_chunked
+
+    if df is None:
+        df, state_index, _ = load_csv_chunked(csv_path)
+    if state_index is None:
+        state_index = StateIndex(df['state'] if 'state' in df.columns else None)
+
+    target = snapshot_dir_for(csv_path)
+    tmp_dir = '%s.tmp-%d' % (target, os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    write_columns(tmp_dir, df, state_index, csv_path)
+    replace_dir(tmp_dir, target)
+    return target
+
+
+def replace_dir(tmp_dir, target):
+    """Move the finished ``tmp_dir`` to ``target``, replacing any previous one"""
+    old_dir = None
+    if os.path.exists(target):
+        old_dir = '%s.old-%d' % (target, os.getpid())
+        os.rename(target, old_dir)
+    os.rename(tmp_dir, target)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def write_columns(directory, df, state_index, csv_path, version=None):
+    """
+    Write ``df`` and ``state_index`` into the existing ``directory``.
+
+    Returns the meta dict. ``version`` defaults to a hash of the CSV; pass
+    it when writing several directories from the same file.
+    """
+    columns = []
+    for n, name in enumerate(df.columns):
+        series = df[name]
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and \
+                pd.api.types.is_integer_dtype(series.dtype):
+            # Nullable integers (e.g. reviews): values plus a missing-value mask
+            np.save(os.path.join(directory, '%d.npy' % n),
+                    series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(directory, '%d.mask.npy' % n), series.isna().to_numpy())
+            columns.append({'name': name, 'kind': 'nullable_int'})
+            continue
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            np.save(os.path.join(directory, '%d.npy' % n), series.to_numpy())
+            columns.append({'name': name, 'kind': 'numeric'})
+            continue
+
+        codes, uniques = pd.factorize(series.astype(object))
+        categories = [str(value) for value in uniques]
+        np.save(os.path.join(directory, '%d.codes.npy' % n),
+                codes.astype(_codes_dtype(len(categories))))
+        _write_json(os.path.join(directory, '%d.categories.json' % n), categories)
+        is_categorical = isinstance(series.dtype, pd.CategoricalDtype)
+        kind = 'categorical' if is_categorical or name in CATEGORICAL_COLUMNS else 'text'
+        columns.append({'name': name, 'kind': kind})
+
+    states, keys, positions, offsets = state_index.to_arrays()
+    np.save(os.path.join(directory, 'state_positions.npy'), positions)
+    np.save(os.path.join(directory, 'state_offsets.npy'), offsets)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'rows': len(df),
+        'columns': columns,
+        'source_size': os.path.getsize(csv_path),
+        'version': version or file_sha1(csv_path)[:16],
+        'states': states,
+        'state_keys': keys,
+    }
+    # meta.json is written last: a directory without it is never loaded
+    _write_json(os.path.join(directory, META_FILE), meta)
+    return meta
+
+
+def load_snapshot(csv_path):
+    """
+    Load the snapshot for ``csv_path``.
+
+    Returns ``(df, state_index, version)``. Raises ``ValueError`` when the
+    snapshot is from another format or no longer matches the CSV size.
+    """
+    df, state_index, meta = read_columns(snapshot_dir_for(csv_path))
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) != meta['source_size']:
+        raise ValueError("snapshot does not match the CSV size")
+    return df, state_index, meta['version']
+
+
+def read_columns(directory, categorical_text=False):
+    """
+    Load a directory written by ``write_columns``.
+
+    Returns ``(df, state_index, meta)``. With ``categorical_text`` every
+    text column stays a categorical over its memory-mapped codes instead
+    of being expanded into an object array.
+    """
+    from data_store import StateIndex
+
+    with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format {meta.get('format')}")
+
+    data = {}
+    for n, column in enumerate(meta['columns']):
+        if column['kind'] == 'numeric':
+            data[column['name']] = np.load(os.path.join(directory, '%d.npy' % n), mmap_mode='r')
+            continue
+        if column['kind'] == 'nullable_int':
+            # Copy-on-write mapping: pandas' hashing of masked arrays rejects
+            # read-only buffers, but untouched pages stay shared
+            data[column['name']] = pd.arrays.IntegerArray(
+                np.load(os.path.join(directory, '%d.npy' % n), mmap_mode='c'),
+                np.load(os.path.join(directory, '%d.mask.npy' % n), mmap_mode='c'))
+            continue
+
+        codes = np.load(os.path.join(directory, '%d.codes.npy' % n), mmap_mode='r')
+        with open(os.path.join(directory, '%d.categories.json' % n), encoding='utf-8') as f:
+            categories = json.load(f)
+        if column['kind'] == 'categorical' or categorical_text:
+            data[column['name']] = pd.Categorical.from_codes(codes, categories)
+        else:
+            # One vectorized take; -1 codes map to the trailing NaN slot
+            values = np.empty(len(categories) + 1, dtype=object)
+            values[:-1] = categories
+            values[-1] = np.nan
+            data[column['name']] = values.take(codes)
+
+    # copy=False keeps the memory-mapped arrays shared instead of copying them
+    df = pd.DataFrame(data, columns=[column['name'] for column in meta['columns']], copy=False)
+    if len(df) != meta['rows']:
+        raise ValueError("snapshot row count does not match meta.json")
+
+    state_index = StateIndex.from_arrays(
+        meta['states'],
+        meta['state_keys'],
+        np.load(os.path.join(directory, 'state_positions.npy'), mmap_mode='r'),
+        np.load(os.path.join(directory, 'state_offsets.npy')),
+    )
+    return df, state_index, meta
+
+
+def main(argv=None):
+    """Compile the CSV given on the command line (or the default path)"""
+    argv = sys.argv[1:] if argv is None else argv
+    csv_path = argv[0] if argv else "LLC Data.csv"
+    if not os.path.exists(csv_path):
+        print(f"CSV file not found: {csv_path}")
+        return 1
+    target = compile_snapshot(csv_path)
+    print(f"Wrote snapshot for {csv_path} to {target}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
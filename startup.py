@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cold-start support: lazily imported modules and import-time tracking.
+
+The static pages (home, top 10, about, contact, legal pages and
+``/api/services``) only need Flask and the service dicts. ``app.py`` binds
+the data modules (``data_store``, ``listings``, ``search``) through
+``lazy_import``, so pandas and NumPy are imported on the first request
+that touches the dataset instead of on every cold start.
+
+Phase timings are recorded with ``mark`` and exposed by ``report``
+(``/api/dataset-stats`` includes them under ``startup``).
+
+    python startup.py [--budget-ms N] [--top N]
+
+imports ``app`` in a fresh interpreter with ``-X importtime``, prints the
+slowest modules and exits non-zero when the total exceeds the budget or
+pandas was imported eagerly, so cold-start regressions show up in CI.
+"""
+
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+
+STARTED = time.perf_counter()
+
+# Modules that must not be imported while the app starts
+HEAVY_MODULES = ('pandas', 'numpy')
+
+_marks = {}
+_lazy_imports = {}
+_lock = threading.Lock()
+
+
+def mark(name):
+    """Record the milliseconds from startup until phase ``name`` completed"""
+    _marks[name] = round((time.perf_counter() - STARTED) * 1000, 1)
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name, on_import=None):
+        self._name = name
+        self._module = None
+        self._on_import = on_import
+
+    def _load(self):
+        with _lock:
+            if self._module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                elapsed = round((time.perf_counter() - started) * 1000, 1)
+                _lazy_imports[self._name] = elapsed
+                print(f"Imported {self._name} on first use in {elapsed:.1f}ms")
+                if self._on_import is not None:
+                    self._on_import(module)
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+
+def lazy_import(name, on_import=None):
+    """Return a LazyModule for ``name``; ``on_import(module)`` runs once it is imported"""
+    return LazyModule(name, on_import)
+
+
+def report():
+    """Startup phase timings, lazy import costs and which heavy modules are loaded"""
+    return {
+        'phases_ms': dict(_marks),
+        'lazy_imports_ms': dict(_lazy_imports),
+        'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output into [(module, self_us, cumulative_us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile_import(module='app'):
+    """Import ``module`` in a fresh interpreter; returns (rows, wall_ms, heavy modules)"""
+    code = (f"import json, sys, time; t = time.perf_counter(); import {module}; "
+            f"print(json.dumps([(time.perf_counter() - t) * 1000, "
+            f"[m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            check=True, capture_output=True, text=True)
+    wall_ms, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return parse_importtime(result.stderr), wall_ms, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import cost of the app")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="fail when importing app takes longer than this")
+    parser.add_argument('--top', type=int, default=15, help="slowest modules to list")
+    args = parser.parse_args(argv)
+
+    rows, wall_ms, heavy = profile_import()
+    print(f"import app: {wall_ms:.1f}ms wall")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f}ms cumulative {self_us / 1000:8.1f}ms self  {name}")
+
+    failed = False
+    if heavy:
+        print(f"Imported eagerly at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms is not None and wall_ms > args.budget_ms:
+        print(f"Over budget: {wall_ms:.1f}ms > {args.budget_ms:.1f}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Handle nested dropdowns
+    const dropdownSubmenus = document.querySelectorAll('.dropdown-submenu');
+
+    dropdownSubmenus.forEach(function(submenu) {
+        const link = submenu.querySelector('.dropdown-toggle');
+        const submenuDropdown = submenu.querySelector('.dropdown-menu');
+
+        // Click functionality for all devices
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+            e.stopPropagation();
+
+            // Close other open submenus
+            dropdownSubmenus.forEach(function(otherSubmenu) {
+                if (otherSubmenu !== submenu) {
+                    otherSubmenu.querySelector('.dropdown-menu').classList.remove('show');
+                }
+            });
+
+            // Toggle current submenu
+            submenuDropdown.classList.toggle('show');
+        });
+
+        // Desktop hover functionality (additional)
+        if (window.innerWidth > 991) {
+            submenu.addEventListener('mouseenter', function() {
+                submenuDropdown.classList.add('show');
+            });
+
+            submenu.addEventListener('mouseleave', function() {
+                submenuDropdown.classList.remove('show');
+            });
+        }
+    });
+
+    // Close dropdowns when clicking outside
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.dropdown')) {
+            document.querySelectorAll('.dropdown-menu').forEach(function(menu) {
+                menu.classList.remove('show');
+            });
+        }
+    });
+
+    // Handle window resize
+    window.addEventListener('resize', function() {
+        if (window.innerWidth > 991) {
+            document.querySelectorAll('.dropdown-menu').forEach(function(menu) {
+                menu.classList.remove('show');
+            });
+        }
+    });
+});
+
+// "Load more" for long listings: fetch the next page of cards as an HTML
+// fragment and put it in place of the button. The button is loaded
+// automatically when it scrolls into view.
+document.addEventListener('DOMContentLoaded', function() {
+    function loadMore(link) {
+        if (link.dataset.loading) {
+            return;
+        }
+        link.dataset.loading = '1';
+        link.classList.add('disabled');
+        fetch(link.href, {headers: {'Accept': 'text/html'}})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                const more = link.closest('[data-listing-more]');
+                more.insertAdjacentHTML('beforebegin', html);
+                more.remove();
+                observeNext();
+            })
+            .catch(function() {
+                delete link.dataset.loading;
+                link.classList.remove('disabled');
+            });
+    }
+
+    const observer = 'IntersectionObserver' in window ? new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                loadMore(entry.target);
+            }
+        });
+    }, {rootMargin: '400px'}) : null;
+
+    function observeNext() {
+        if (observer) {
+            document.querySelectorAll('[data-listing-next]').forEach(function(link) {
+                observer.observe(link);
+            });
+        }
+    }
+
+    document.addEventListener('click', function(e) {
+        const link = e.target.closest('[data-listing-next]');
+        if (link) {
+            e.preventDefault();
+            loadMore(link);
+        }
+    });
+    observeNext();
+});
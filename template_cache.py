@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Template-side caching: a fragment cache tag and a persistent bytecode cache.
+
+``{% cache key, ... %}...{% endcache %}`` renders its body once per
+distinct set of key values and reuses the output afterwards. Keys are
+hashed by content (JSON), together with the template name and line, so
+passing the data a block is built from (a ``SERVICE_INFO`` entry, or
+``content_version`` for blocks built from all of them) re-renders it
+exactly when that data changes. A cached block must not read anything
+that is not part of its key.
+
+Compiled templates are kept as Jinja bytecode in ``TEMPLATE_CACHE_DIR``
+(default ``template_cache/``) when that directory exists:
+
+    python template_cache.py
+
+compiles every template into it at build time, so a cold instance loads
+bytecode instead of parsing and compiling templates on first render.
+Entries are keyed by the template source's checksum and the Python
+version, so an edited template is simply recompiled. On a read-only
+filesystem the directory is only read.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+TEMPLATE_CACHE_DIR = os.environ.get(
+    'TEMPLATE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template_cache'))
+
+# Rendered fragments kept in memory
+DEFAULT_MAX_FRAGMENTS = 512
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension adding the ``{% cache %}`` tag"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        fragment = nodes.Const(f'{parser.name}:{lineno}')
+        call = self.call_method('_render', [fragment, nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, fragment, parts, caller):
+        cache = getattr(self.environment, 'fragment_cache', None)
+        if cache is None:
+            return caller()
+        key = cache.key(fragment, parts)
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.put(key, html)
+        return Markup(html)
+
+
+class FragmentCache:
+    """Bounded LRU of rendered ``{% cache %}`` blocks keyed by content hash"""
+
+    def __init__(self, app=None, max_entries=DEFAULT_MAX_FRAGMENTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+
+    @staticmethod
+    def key(fragment, parts):
+        digest = hashlib.sha1(fragment.encode('utf-8'))
+        digest.update(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that keeps working when the directory is read-only"""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def use_bytecode_cache(app, directory=TEMPLATE_CACHE_DIR):
+    """Load and store ``app``'s compiled templates in ``directory`` if it exists"""
+    if not os.path.isdir(directory):
+        return None
+    app.jinja_env.bytecode_cache = TemplateBytecodeCache(directory)
+    return app.jinja_env.bytecode_cache
+
+
+def compile_templates(app, directory=TEMPLATE_CACHE_DIR):
+    """Compile every template of ``app`` into ``directory``; returns the count"""
+    os.makedirs(directory, exist_ok=True)
+    env = app.jinja_env
+    env.bytecode_cache = TemplateBytecodeCache(directory)
+    names = env.list_templates(extensions=('html',))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompile the app's templates to bytecode")
+    parser.add_argument('--out', default=TEMPLATE_CACHE_DIR, help="bytecode cache directory")
+    args = parser.parse_args(argv)
+
+    from app import app
+    count = compile_templates(app, args.out)
+    print(f"Compiled {count} templates to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import gzip
+import json
+import re
+import time
+from collections import Counter
+
+import pytest
+
+import app as app_module
+import startup
+from data_store import dataset_cache
+from test_data_store import write_csv
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, [
+        "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+        "B,West Virginia,Charleston,2,4.5,1,Lawyer,Office,x",
+        "C,Virginia,Norfolk,,,1,Lawyer,Office,x",
+        "D,Texas,Austin,4,3.0,9,Lawyer,Office,x",
+    ])
+    # Warming runs in background threads; tests that need it call it directly
+    monkeypatch.setattr(app_module.warmer, 'top_n', 0)
+    monkeypatch.setattr(app_module.warmer, 'indexes', lambda: [])
+    monkeypatch.setattr(app_module.warmer, 'hits', Counter())
+    cache = dataset_cache
+    old_paths = cache.paths
+    cache.paths = [str(csv_path)]
+    cache.clear()
+    app_module.page_cache.clear()
+    yield app_module.app.test_client()
+    cache.paths = old_paths
+    cache.clear()
+    app_module.page_cache.clear()
+
+
+def test_api_states_counts(client):
+    response = client.get('/api/states')
+    assert response.json == [
+        {'state': 'Texas', 'service_count': 1},
+        {'state': 'Virginia', 'service_count': 2},
+        {'state': 'West Virginia', 'service_count': 1},
+    ]
+
+
+def test_api_data_summary_revalidates_with_etag(client):
+    response = client.get('/api/data-summary')
+    assert response.status_code == 200
+    assert response.json['total_records'] == 4
+    assert response.json['unique_cities'] == 4
+    etag = response.headers['ETag']
+
+    revalidated = client.get('/api/data-summary', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_service_state_page_is_cached_and_compressed(client):
+    page_cache = app_module.page_cache
+    first = client.get('/service/LegalZoom/Virginia')
+    assert first.status_code == 200
+    # Exact state match: West Virginia's rows are not included
+    assert b'Richmond' in first.data and b'Charleston' not in first.data
+    misses = page_cache.stats()['misses']
+
+    second = client.get('/service/LegalZoom/Virginia', headers={'Accept-Encoding': 'gzip'})
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert page_cache.stats()['misses'] == misses
+
+    revalidated = client.get('/service/LegalZoom/Virginia',
+                             headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_api_listings_filters_sorts_and_paginates(client):
+    first = client.get('/api/listings?state=Virginia&sort=rating&limit=1').json
+    assert first['total'] == 2
+    assert [r['name'] for r in first['results']] == ['A']
+
+    names = [r['name'] for r in first['results']]
+    cursor = first['next_cursor']
+    while cursor:
+        page = client.get(f'/api/listings?state=Virginia&sort=rating&limit=1&cursor={cursor}').json
+        names += [r['name'] for r in page['results']]
+        cursor = page['next_cursor']
+    assert names == ['A', 'C']
+    assert [r['name'] for r in client.get('/api/listings?state=wv').json['results']] == ['B']
+
+    filtered = client.get('/api/listings?city=austin&min_rating=2.5').json
+    assert [r['name'] for r in filtered['results']] == ['D']
+    assert client.get('/api/listings?sort=price').status_code == 400
+
+
+def test_api_export_streams_csv_and_gzipped_ndjson(client, monkeypatch):
+    monkeypatch.setattr(app_module.export, 'CHUNK_ROWS', 1)
+    response = client.get('/api/export/csv?state=VA')
+    assert response.is_streamed and response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('name,state,city,phone')
+    assert [line.split(',')[0] for line in lines[1:]] == ['A', 'C']
+
+    response = client.get('/api/export/ndjson?sort=rating&min_rating=3',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = [json.loads(line) for line in gzip.decompress(response.data).splitlines()]
+    assert [row['name'] for row in rows] == ['B', 'A', 'D']
+    assert rows[0]['rating'] == 4.5 and rows[0]['phone'] == '2'
+
+    refused = client.get('/api/export/csv', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in refused.headers
+    assert refused.get_data(as_text=True).startswith('name,')
+
+    assert client.get('/api/export/csv?city=Atlantis').get_data(as_text=True).count('\n') == 1
+    assert client.get('/api/export/xml').status_code == 404
+    assert client.get('/api/export/csv?min_rating=high').status_code == 400
+
+
+def test_api_search_ranks_and_supports_prefix(client):
+    response = client.get('/api/search?q=richm')
+    assert response.status_code == 200
+    assert [r['city'] for r in response.json['results']] == ['Richmond']
+    assert response.json['partial'] is False
+
+    assert client.get('/api/search?q=richm&prefix=0').json['results'] == []
+    assert client.get('/api/search').status_code == 400
+
+
+def test_service_state_summary_covers_all_rows(client):
+    body = client.get('/service/LegalZoom/Virginia').get_data(as_text=True)
+    summary = body[body.index('Summary for Virginia'):]
+    # Two rows match; one is rated (4.0); two distinct cities; one phone
+    assert '<h5 class="text-primary">2</h5>' in summary
+    assert '<h5 class="text-warning">4.0</h5>' in summary
+    assert '<h5 class="text-success">2</h5>' in summary
+    assert '<h5 class="text-primary">1</h5>' in summary
+
+
+def test_state_aliases_redirect_to_canonical_url(client):
+    for alias in ('VA', 'va', 'virginia', 'VIRGINIA%20'):
+        response = client.get(f'/service/LegalZoom/{alias}?ref=x')
+        assert response.status_code == 301
+        assert response.headers['Location'] == '/service/LegalZoom/Virginia?ref=x'
+    assert client.get('/service/LegalZoom/Virginia').status_code == 200
+
+
+def test_canonical_redirect_keeps_query_string_as_sent(client):
+    response = client.get('/service/LegalZoom/tx?state=x&city=y')
+    assert response.status_code == 301
+    assert response.headers['Location'] == '/service/LegalZoom/Texas?state=x&city=y'
+
+    response = client.get('/service/LegalZoom/va/richmond?x=1&x=2')
+    assert response.status_code == 301
+    assert response.headers['Location'] == '/service/LegalZoom/Virginia/Richmond?x=1&x=2'
+
+
+def test_service_city_page_lists_city_rows(client):
+    state_page = client.get('/service/LegalZoom/Virginia').get_data(as_text=True)
+    assert 'href="/service/LegalZoom/Virginia/Richmond"' in state_page
+
+    body = client.get('/service/LegalZoom/Virginia/Richmond').get_data(as_text=True)
+    assert '1 business in Richmond' in body
+    assert 'Norfolk' in body.split('Other cities in Virginia')[1]
+    response = client.get('/service/LegalZoom/va/richmond?ref=x')
+    assert response.status_code == 301
+    assert response.headers['Location'] == '/service/LegalZoom/Virginia/Richmond?ref=x'
+    assert client.get('/service/LegalZoom/Virginia/Tulsa').status_code == 404
+    assert client.get('/service/LegalZoom/Atlantis/Tulsa').status_code == 404
+
+
+def test_long_listings_load_more_as_cached_fragments(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'LISTING_PAGE_SIZE', 1)
+    body = client.get('/service/LegalZoom/Virginia').get_data(as_text=True)
+    assert '<h5 class="card-title mb-1">A</h5>' in body
+    assert '<h5 class="card-title mb-1">C</h5>' not in body
+    assert 'href="/fragments/service/LegalZoom/Virginia/page/2"' in body
+
+    fragment = client.get('/fragments/service/LegalZoom/Virginia/page/2')
+    assert fragment.status_code == 200 and fragment.headers['ETag']
+    html = fragment.get_data(as_text=True)
+    assert '<h5 class="card-title mb-1">C</h5>' in html
+    assert '<html' not in html and 'data-listing-next' not in html
+    misses = app_module.page_cache.stats()['misses']
+    client.get('/fragments/service/LegalZoom/Virginia/page/2')
+    assert app_module.page_cache.stats()['misses'] == misses
+
+    assert client.get('/fragments/service/LegalZoom/Virginia/page/3').status_code == 404
+    assert client.get('/fragments/service/LegalZoom/Virginia/Richmond/page/1').status_code == 200
+    response = client.get('/fragments/service/LegalZoom/va/page/2')
+    assert response.headers['Location'] == '/fragments/service/LegalZoom/Virginia/page/2'
+
+
+def test_api_cities_counts(client):
+    response = client.get('/api/cities/va')
+    assert response.json == {'state': 'Virginia', 'cities': [
+        {'city': 'Norfolk', 'count': 1}, {'city': 'Richmond', 'count': 1}]}
+    assert client.get('/api/cities/West%20Virginia').headers['ETag']
+    assert client.get('/api/cities/Atlantis').status_code == 404
+
+
+def test_pages_are_served_stale_while_rerendering(client, monkeypatch):
+    page_cache = app_module.page_cache
+    first = client.get('/service/LegalZoom/Virginia')
+    monkeypatch.setattr(app_module, 'CONTENT_VERSION', 'changed')
+
+    stale = client.get('/service/LegalZoom/Virginia')
+    assert stale.headers['ETag'] == first.headers['ETag']
+    assert page_cache.stats()['stale_hits'] == 1
+    deadline = time.time() + 5
+    while page_cache.stats()['entries'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.get('/service/LegalZoom/Virginia').headers['ETag'] != first.headers['ETag']
+
+
+def test_warmer_renders_most_requested_pages(client, monkeypatch):
+    warmer = app_module.warmer
+    monkeypatch.setattr(warmer, 'top_n', 2)
+    for url in ('/service/LegalZoom/Texas', '/service/LegalZoom/Texas',
+                '/service/LegalZoom/Virginia', '/about'):
+        client.get(url)
+    dataset = dataset_cache.get()
+    assert warmer.top_pages(dataset) == ['/service/LegalZoom/Texas', '/service/LegalZoom/Virginia']
+
+    app_module.page_cache.clear()
+    assert warmer.warm_pages(dataset) == 2
+    misses = app_module.page_cache.stats()['misses']
+    client.get('/service/LegalZoom/Virginia')
+    assert app_module.page_cache.stats()['misses'] == misses
+
+    # Before any hits: service pages, then the busiest state first
+    warmer.hits.clear()
+    monkeypatch.setattr(warmer, 'top_n', 100)
+    urls = warmer.top_pages(dataset)
+    assert urls[0] == '/service/Northwestern'
+    assert urls[len(app_module.TOP_LLC_SERVICES)] == '/service/Northwestern/Virginia'
+
+
+def test_assets_are_fingerprinted_and_immutable(client):
+    html = client.get('/').get_data(as_text=True)
+    urls = re.findall(r'/static/assets/site\.[0-9a-f]+\.(?:css|js)', html)
+    assert len(set(urls)) == 2
+    response = client.get(urls[0])
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get('/static/assets/site.0000.css').status_code == 404
+
+
+def test_responses_are_compressed_with_etag_and_policy(client):
+    response = client.get('/about', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    again = client.get('/about', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+
+    plain = client.get('/about')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['ETag'] != etag
+    assert client.get('/api/dataset-stats').headers['Cache-Control'] == 'no-store'
+
+
+def test_app_import_does_not_load_pandas():
+    _, _, heavy = startup.profile_import('app')
+    assert heavy == []
+
+
+def test_server_timing_and_metrics(client):
+    response = client.get('/service/LegalZoom/Virginia')
+    timing = response.headers['Server-Timing']
+    assert 'render;dur=' in timing and 'total;dur=' in timing
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE llc_request_duration_seconds histogram' in body
+    assert 'llc_span_seconds_count{span="render"}' in body
+    assert 'endpoint="service_state_page"' in body
+
+
+def test_saturated_work_pool_returns_fast_503(client, monkeypatch):
+    monkeypatch.setattr(app_module.work_pool, 'max_pending', -app_module.work_pool.max_workers)
+    response = client.get('/api/listings?state=Virginia')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'error' in response.get_json()
+    assert client.get('/service/LegalZoom/Virginia').status_code == 503
+    # Pages that need no data work are unaffected
+    assert client.get('/about').status_code == 200
@@ -0,0 +1,33 @@
+import pandas as pd
+
+import benchmark
+from test_app import client  # noqa: F401  (fixture pointing the app at a temp CSV)
+
+
+def test_generated_csv_is_skewed_and_loadable(tmp_path):
+    path = benchmark.generate_csv(str(tmp_path / "LLC Data.csv"), 5000, seed=1)
+    df = pd.read_csv(path)
+    assert len(df) == 5000
+    states = df['state'].str.strip().str.title().value_counts()
+    assert states.index[0] == 'California'
+    assert states['California'] > 10 * states.get('Wyoming', 0)
+    # Zipf cities: the busiest city holds a large share of the rows
+    assert df['city'].value_counts().iloc[0] > len(df) / 5
+
+
+def test_compare_flags_p95_regressions():
+    baseline = {'client': {'/': {'p95_ms': 1.0}, '/about': {'p95_ms': 2.0}}}
+    current = {'client': {'/': {'p95_ms': 1.5}, '/about': {'p95_ms': 2.1}}}
+    assert benchmark.compare(baseline, current, threshold=20) == [('client', '/')]
+
+
+def test_benchmark_urls_cover_every_get_route(client):
+    import app as app_module
+
+    urls = benchmark.benchmark_urls(app_module, app_module.get_dataset())
+    adapter = app_module.app.url_map.bind('localhost')
+    covered = {adapter.match(url.split('?')[0])[0] for url in urls}
+    routes = {rule.endpoint for rule in app_module.app.url_map.iter_rules()
+              if rule.endpoint != 'static' and 'GET' in rule.methods}
+    assert covered == routes
+    assert any(url.startswith('/api/export/ndjson') for url in urls)
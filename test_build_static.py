@@ -0,0 +1,72 @@
+import json
+import os
+
+import app as app_module
+import build_static
+from data_store import dataset_cache
+from test_app import client  # noqa: F401  (fixture pointing the app at a temp CSV)
+from test_data_store import write_csv
+
+
+def test_static_build_is_incremental(client, tmp_path):
+    out_dir = str(tmp_path / "dist")
+
+    rendered, skipped, failed = build_static.build(out_dir, jobs=1)
+    assert failed == 0 and skipped == 0 and rendered > 0
+    assert os.path.exists(os.path.join(out_dir, 'service', 'LegalZoom', 'Virginia', 'index.html'))
+    assert os.path.exists(os.path.join(out_dir, 'service', 'LegalZoom', 'Virginia', 'Richmond',
+                                       'index.html'))
+    with open(os.path.join(out_dir, 'api', 'states.json'), encoding='utf-8') as f:
+        assert {'state': 'Texas', 'service_count': 1} in json.load(f)
+
+    rendered, skipped, failed = build_static.build(out_dir, jobs=1)
+    assert rendered == 0 and failed == 0
+    # Building in-process leaves the app's page cache working
+    assert app_module.page_cache.max_bytes > 0
+
+
+def test_static_build_with_worker_processes(client, tmp_path):
+    out_dir = str(tmp_path / "dist")
+
+    assert build_static.main(['--out', out_dir, '--jobs', '2']) == 0
+    assert os.path.exists(os.path.join(out_dir, 'service', 'LegalZoom', 'Texas', 'Austin',
+                                       'index.html'))
+
+
+def test_static_build_writes_load_more_fragments(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'LISTING_PAGE_SIZE', 1)
+    out_dir = str(tmp_path / "dist")
+
+    rendered, skipped, failed = build_static.build(out_dir, jobs=1)
+    assert failed == 0
+    with open(os.path.join(out_dir, 'service', 'LegalZoom', 'Virginia', 'index.html'),
+              encoding='utf-8') as f:
+        assert 'href="/fragments/service/LegalZoom/Virginia/page/2"' in f.read()
+    with open(os.path.join(out_dir, 'fragments', 'service', 'LegalZoom', 'Virginia', 'page', '2',
+                           'index.html'), encoding='utf-8') as f:
+        assert 'Norfolk' in f.read()
+    assert not os.path.exists(os.path.join(out_dir, 'fragments', 'service', 'LegalZoom', 'Virginia',
+                                           'page', '3'))
+
+
+def test_state_summary_change_past_first_page_rebuilds_state_page(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'LISTING_PAGE_SIZE', 1)
+    csv_path = tmp_path / "LLC Data.csv"
+    rows = [
+        "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+        "C,Virginia,Norfolk,,,1,Lawyer,Office,x",
+        "E,Virginia,Roanoke,,,1,Lawyer,Office,x",
+    ]
+    write_csv(csv_path, rows)
+    dataset_cache.clear()
+    out_dir = str(tmp_path / "dist")
+    page = os.path.join(out_dir, 'service', 'LegalZoom', 'Virginia', 'index.html')
+    build_static.build(out_dir, jobs=1)
+
+    # Only Roanoke's row (past the first page and its lookahead row) gains a rating
+    write_csv(csv_path, rows[:2] + ["E,Virginia,Roanoke,,5.0,1,Lawyer,Office,x"])
+    dataset_cache.clear()
+    rendered, _, failed = build_static.build(out_dir, jobs=1)
+    assert failed == 0 and rendered > 0
+    with open(page, encoding='utf-8') as f:
+        assert '<h5 class="text-warning">4.5</h5>' in f.read()
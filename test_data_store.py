@@ -0,0 +1,171 @@
+import os
+import threading
+
+from data_store import DatasetCache
+
+CSV_HEADER = "name,state,city,phone,rating,reviews,category,type,description\n"
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(CSV_HEADER)
+        for row in rows:
+            f.write(row + "\n")
+
+
+def test_dataset_loaded_once(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    cache = DatasetCache(paths=[str(csv_path)])
+
+    first = cache.get()
+    second = cache.get()
+
+    assert first is second
+    assert len(first.df) == 1
+    stats = cache.stats()
+    assert (stats['misses'], stats['hits'], stats['reloads']) == (1, 1, 0)
+
+
+def test_dataset_reloads_when_file_changes(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    cache = DatasetCache(paths=[str(csv_path)])
+    first = cache.get()
+
+    write_csv(csv_path, [
+        "Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good",
+        "Beta,Texas,Austin,556,4.0,3,Lawyer,Office,Fine",
+    ])
+    st = os.stat(csv_path)
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    second = cache.get()
+    assert second is not first
+    assert second.version != first.version
+    assert len(second.df) == 2
+    assert cache.stats()['reloads'] == 1
+
+
+def test_changed_file_reloads_in_background_while_stale_is_served(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    cache = DatasetCache(paths=[str(csv_path)], background=True)
+    first = cache.get()
+    prepared = []
+    cache.prepare = lambda dataset: prepared.append(len(dataset.df))
+
+    write_csv(csv_path, [
+        "Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good",
+        "Beta,Texas,Austin,556,4.0,3,Lawyer,Office,Fine",
+    ])
+    assert cache.current() is first
+    cache._reloader.join(5)
+
+    second = cache.current()
+    assert len(second.df) == 2 and prepared == [2]
+    assert cache.stats()['stale_hits'] == 1 and cache.stats()['reloads'] == 1
+
+
+def test_first_load_is_only_warmed_when_asked(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    warmed = threading.Event()
+    cache = DatasetCache(paths=[str(csv_path)])
+    cache.prepare = lambda dataset: warmed.set()
+    cache.get()
+    assert not warmed.wait(0.2)
+
+    cache = DatasetCache(paths=[str(csv_path)])
+    cache.prepare = lambda dataset: warmed.set()
+    cache.warm_first_load = True
+    cache.get()
+    assert warmed.wait(5)
+
+
+def test_missing_file_returns_empty_dataset(tmp_path):
+    cache = DatasetCache(paths=[str(tmp_path / "missing.csv")])
+    dataset = cache.get()
+    assert dataset.empty
+    assert cache.get() is dataset
+
+
+def test_state_index_uses_canonical_keys(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, [
+        "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+        "B,West Virginia,Charleston,2,4.0,1,Lawyer,Office,x",
+        "C,Kansas,Wichita,3,4.0,1,Lawyer,Office,x",
+        "D,,Nowhere,4,4.0,1,Lawyer,Office,x",
+        "E,virginia,Norfolk,5,4.0,1,Lawyer,Office,x",
+    ])
+    dataset = DatasetCache(paths=[str(csv_path)]).get()
+
+    # Spelling variants are merged at ingest
+    assert dataset.states == ['Kansas', 'Virginia', 'West Virginia']
+    assert list(dataset.df['state'].astype(object)[[0, 4]]) == ['Virginia', 'Virginia']
+    for alias in ('Virginia', 'VIRGINIA', ' virginia ', 'VA', 'va'):
+        assert [r['name'] for r in dataset.state_records(alias)] == ['A', 'E']
+        assert dataset.canonical_state(alias) == 'Virginia'
+    assert [r['name'] for r in dataset.state_records('WV')] == ['B']
+    assert dataset.state_index.count('sas') == 0
+    assert dataset.state_index.count('nan') == 0
+    assert dataset.canonical_state('Nowhere') is None
+
+
+def test_state_records_are_sanitized_strings(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, [
+        "A,Texas,,1,4.0,12,Lawyer,,x",
+        "B,Texas,Austin,,,3,Lawyer,Office,",
+    ])
+    dataset = DatasetCache(paths=[str(csv_path)]).get()
+
+    records = dataset.state_records('Texas', limit=50)
+    assert records[0]['city'] == '' and records[0]['type'] == ''
+    assert records[0]['rating'] == '4.0' and records[0]['reviews'] == '12'
+    assert records[1]['phone'] == '' and records[1]['rating'] == ''
+    assert dataset.state_records('texas', limit=50) is records
+
+
+def test_city_index_groups_cities_by_state(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, [
+        "A,Texas,Austin,1,4.0,1,Lawyer,Office,x",
+        "B,Texas,Dallas,2,4.0,1,Lawyer,Office,x",
+        "C,texas,austin ,3,4.0,1,Lawyer,Office,x",
+        "D,Ohio,Austin,4,4.0,1,Lawyer,Office,x",
+        "E,Texas,,5,4.0,1,Lawyer,Office,x",
+    ])
+    dataset = DatasetCache(paths=[str(csv_path)]).get()
+
+    assert dataset.cities('TX') == [{'city': 'Austin', 'count': 2},
+                                    {'city': 'Dallas', 'count': 1}]
+    assert dataset.cities('Ohio') == [{'city': 'Austin', 'count': 1}]
+    assert dataset.canonical_city('texas', 'AUSTIN') == 'Austin'
+    assert dataset.canonical_city('Ohio', 'Dallas') is None
+    assert [r['name'] for r in dataset.city_records('Texas', 'austin')] == ['A', 'C']
+    assert dataset.city_records('Texas', 'Houston') == []
+
+
+def test_independent_index_builds_do_not_block_each_other(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    dataset = DatasetCache(paths=[str(csv_path)]).get()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build(dataset):
+        started.set()
+        release.wait(5)
+        return 'slow'
+
+    builder = threading.Thread(target=dataset.derived, args=('slow', slow_build))
+    builder.start()
+    assert started.wait(5)
+    # Neither another index nor the records cache waits for the slow build
+    assert dataset.derived('fast', lambda dataset: 'fast') == 'fast'
+    assert [r['name'] for r in dataset.state_records('Florida')] == ['Acme']
+    assert builder.is_alive()
+    release.set()
+    builder.join(5)
+    assert dataset.derived('slow', slow_build) == 'slow'
@@ -0,0 +1,25 @@
+import pandas as pd
+
+import geo
+
+
+def test_state_key_accepts_names_codes_and_variants():
+    for spelling in ('Texas', 'texas ', 'TEXAS', 'TX', 'tx', ' T.X. '):
+        assert geo.state_key(spelling) == 'TX'
+    assert geo.state_key('Washington, D.C.') == geo.state_key('DC') == 'DC'
+    assert geo.state_key('U.S. Virgin Islands') == geo.state_key('virgin-islands') == 'VI'
+    assert geo.state_key('Washington DC') == 'DC'
+    assert geo.state_key('New  York') == 'NY'
+    assert geo.state_key('Atlantis') == 'atlantis'
+
+
+def test_canonicalize_picks_one_spelling_per_key():
+    states = geo.canonicalize(pd.Series(['tx', 'Texas ', None, 'atlantis', 'Atlantis', 'Atlantis']),
+                              geo.state_key, geo.state_name)
+    assert states.tolist()[:2] == ['Texas', 'Texas']
+    assert pd.isna(states[2])
+    # Unknown states use their most common spelling
+    assert states.tolist()[3:] == ['Atlantis'] * 3
+
+    cities = geo.canonicalize(pd.Series(['Austin', 'austin', ' Austin', 'El  Paso']), geo.city_key)
+    assert cities.tolist() == ['Austin', 'Austin', 'Austin', 'El Paso']
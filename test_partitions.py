@@ -0,0 +1,79 @@
+import pandas as pd
+
+import partitions
+from data_store import Dataset, DatasetCache
+from ingest import load_csv_chunked
+from test_data_store import write_csv
+
+ROWS = [
+    "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+    "B,West Virginia,Charleston,,4.5,1,Lawyer,Office,x",
+    "C,Virginia,Norfolk,3,,1,Lawyer,Office,x",
+    "D,Texas,Austin,4,3.0,9,Lawyer,Office,x",
+    "E,,Nowhere,5,2.0,1,Lawyer,Office,x",
+    "F,West Virginia,Wheeling,6,5.0,2,Lawyer,Office,x",
+]
+
+
+def open_partitioned(tmp_path, cache=None):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ROWS)
+    partitions.write_partitions(str(csv_path))
+    partitions.partition_cache.clear()
+    dataset = DatasetCache(paths=[str(csv_path)], partitioned=True).get()
+    if cache is not None:
+        dataset.cache = cache
+    df, state_index, _ = load_csv_chunked(str(csv_path))
+    return dataset, Dataset(df, state_index=state_index)
+
+
+def test_catalog_answers_state_lists_without_loading_partitions(tmp_path):
+    dataset, full = open_partitioned(tmp_path)
+
+    assert dataset.source == 'partitions'
+    assert dataset.states == full.states
+    assert dataset.aggregates.states == full.aggregates.states
+    assert dataset.aggregates.summary() == full.aggregates.summary()
+    for state in ('Virginia', 'wv', 'Nowhere'):
+        assert dataset.state_preview(state) == full.state_preview(state)
+    assert partitions.partition_cache.stats()['misses'] == 0
+
+
+def test_state_lookups_load_only_that_states_partition(tmp_path):
+    dataset, full = open_partitioned(tmp_path)
+
+    assert dataset.state_records('Texas') == full.state_records('Texas')
+    assert partitions.partition_cache.stats()['entries'] == 1
+    assert dataset.state_records('VA', limit=1) == full.state_records('Virginia', limit=1)
+    assert partitions.partition_cache.stats()['entries'] == 2
+    assert dataset.canonical_state('wv') == 'West Virginia'
+    for state in ('Virginia', 'west virginia', 'TX', 'Nowhere'):
+        assert dataset.state_stats(state) == full.state_stats(state)
+
+
+def test_city_lookups_use_the_state_partition(tmp_path):
+    dataset, full = open_partitioned(tmp_path)
+
+    assert dataset.cities('WV') == full.cities('West Virginia')
+    assert dataset.canonical_city('Virginia', 'norfolk') == 'Norfolk'
+    assert dataset.city_records('Virginia', 'Norfolk') == full.city_records('Virginia', 'Norfolk')
+    assert partitions.partition_cache.stats()['entries'] == 2
+    assert dataset.cities('Atlantis') == [] and dataset.canonical_city('Atlantis', 'x') is None
+
+
+def test_full_frame_is_reassembled_in_csv_order(tmp_path):
+    dataset, full = open_partitioned(tmp_path)
+
+    pd.testing.assert_frame_equal(dataset.df.astype(object), full.df.astype(object))
+    assert list(dataset.full().state_index.positions('virginia')) == [0, 2]
+
+
+def test_partition_cache_evicts_least_recently_used(tmp_path):
+    dataset, _ = open_partitioned(tmp_path, cache=partitions.PartitionCache(max_bytes=1))
+
+    dataset.state_records('Texas')
+    dataset.state_records('West Virginia')
+    stats = dataset.cache.stats()
+    assert (stats['entries'], stats['evictions']) == (1, 1)
+    dataset.state_records('West Virginia')
+    assert dataset.cache.stats()['hits'] == 1
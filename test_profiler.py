@@ -0,0 +1,19 @@
+import threading
+import time
+
+from profiler import StackSampler
+from work_pool import WorkPool
+
+
+def test_sampler_follows_work_pool_threads():
+    pool = WorkPool(max_workers=1)
+    sampler = StackSampler(threading.get_ident(), interval=0.001).start()
+
+    def slow_query():
+        time.sleep(0.1)
+        return 'done'
+
+    assert pool.run('key', sampler.follow(slow_query)) == 'done'
+    samples = sampler.stop()
+    assert any(stack.endswith('test_profiler.py:slow_query') for stack in samples)
+    assert sampler.helpers == set()
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import search
+from data_store import DatasetCache
+from search import SearchIndex
+from test_data_store import write_csv
+
+
+def make_frame(names):
+    return pd.DataFrame({
+        'name': names,
+        'city': ['Austin'] * len(names),
+        'category': ['Lawyer'] * len(names),
+        'description': [None] * len(names),
+    })
+
+
+def test_name_matches_rank_above_description_matches():
+    df = make_frame(['Acme Filing', 'Other Corp'])
+    df.loc[1, 'description'] = 'we beat acme on price'
+    positions, scores, partial = SearchIndex.build(df).search('acme', prefix=False)
+    assert list(positions) == [0, 1]
+    assert scores[0] > scores[1] and not partial
+
+
+def test_incremental_rebuild_matches_full_build():
+    old = make_frame(['Acme Filing', 'Beta Legal', 'Gamma Law'])
+    new = make_frame(['Beta Legal', 'Delta Filing', 'Gamma Law', 'Acme Filing'])
+    previous = SearchIndex.build(old)
+
+    incremental = SearchIndex.build(new, previous=previous)
+    full = SearchIndex.build(new)
+
+    assert incremental.reused_rows == 3
+    assert set(incremental.postings) == set(full.postings)
+    for term, (positions, freqs) in full.postings.items():
+        assert np.array_equal(incremental.postings[term][0], positions)
+        assert np.array_equal(incremental.postings[term][1], freqs)
+    assert np.array_equal(incremental.doc_lengths, full.doc_lengths)
+
+
+def test_row_keys_are_stable_across_processes():
+    df = make_frame(['Acme Filing', 'Beta Legal'])
+    script = ("import pandas as pd, search; "
+              "df = pd.DataFrame({'name': ['Acme Filing', 'Beta Legal'], 'city': ['Austin'] * 2, "
+              "'category': ['Lawyer'] * 2, 'description': [None] * 2}); "
+              "print(list(search._row_keys(df)))")
+    outputs = {subprocess.run([sys.executable, '-c', script], check=True, capture_output=True,
+                              text=True, env=dict(os.environ, PYTHONHASHSEED=seed)).stdout
+               for seed in ('1', '2')}
+    assert outputs == {f"{list(search._row_keys(df))}\n"}
+
+
+def test_reload_rebuilds_search_index_from_previous_generation(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good"])
+    cache = DatasetCache(paths=[str(csv_path)], background=False)
+    first = cache.get().derived('search', search.build_search_index)
+
+    write_csv(csv_path, ["Acme,Florida,Miami,555,4.5,10,Lawyer,Office,Good",
+                         "Beta,Texas,Austin,556,4.0,3,Lawyer,Office,Fine"])
+    st = os.stat(csv_path)
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = cache.get().derived('search', search.build_search_index)
+    assert second is not first
+    assert (second.n_docs, second.reused_rows) == (2, 1)
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pandas as pd
+
+import shared_dataset
+from data_store import DatasetCache
+from ingest import load_csv_chunked
+from listings import ListingIndex
+from search import build_search_index
+from test_data_store import write_csv
+
+ROWS = [
+    "Acme Filing,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+    "Bolt LLC,West Virginia,,2,,1,Lawyer,Office,acme partner",
+    "Crest,Kansas,Wichita,3,3.5,7,Accountant,,z",
+]
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+
+def test_workers_attach_to_published_generation(tmp_path):
+    csv_path = str(tmp_path / "LLC Data.csv")
+    write_csv(csv_path, ROWS)
+    expected, _, _ = load_csv_chunked(csv_path)
+
+    dataset = DatasetCache(paths=[csv_path], shared=True).get()
+    assert dataset.source == 'shared'
+    pd.testing.assert_frame_equal(dataset.df.astype(object), expected.astype(object))
+    assert list(dataset.state_index.positions('virginia')) == [0]
+
+    # Indexes come from the generation, not rebuilt per worker
+    listings = dataset.derived('listings', ListingIndex)
+    positions, _, total = listings.query(sort='rating', category='lawyer')
+    assert (list(positions), total) == ([0, 1], 2)
+    positions, _, _ = dataset.derived('search', build_search_index).search('acme')
+    assert list(positions) == [0, 1]
+
+    # A second worker attaches to the same generation
+    other = DatasetCache(paths=[csv_path], shared=True).get()
+    assert other.signature == dataset.signature
+
+
+def test_changed_csv_publishes_new_generation(tmp_path):
+    csv_path = str(tmp_path / "LLC Data.csv")
+    write_csv(csv_path, ROWS)
+    cache = DatasetCache(paths=[csv_path], shared=True)
+    first = cache.get()
+
+    write_csv(csv_path, ROWS + ["Dune,Texas,Austin,4,5.0,2,Lawyer,Office,w"])
+    st = os.stat(csv_path)
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    # The old generation keeps serving while the new one is built
+    assert len(cache.get().df) in (3, 4)
+    wait_for(lambda: len(cache.get().df) == 4)
+    assert cache.get().signature != first.signature
+    assert len(first.df) == 3
+
+
+def test_publish_removes_staging_left_by_a_dead_publisher(tmp_path):
+    csv_path = str(tmp_path / "LLC Data.csv")
+    write_csv(csv_path, ROWS)
+    shared_dir = shared_dataset.shared_dir_for(csv_path)
+    abandoned = os.path.join(shared_dir, '.tmp-999999')
+    os.makedirs(abandoned)
+    with open(os.path.join(shared_dir, 'CURRENT.tmp-999999'), 'w') as f:
+        f.write('g0')
+
+    shared_dataset.publish(csv_path)
+    assert sorted(name for name in os.listdir(shared_dir) if 'tmp' in name) == []
@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+
+import snapshot
+from data_store import DatasetCache
+from ingest import load_csv_chunked
+from test_data_store import write_csv
+
+
+def test_snapshot_round_trip(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, [
+        "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+        "B,West Virginia,,2,,1,Lawyer,Office,y",
+        "C,Kansas,Wichita,3,3.5,7,Lawyer,,z",
+    ])
+    expected, _, _ = load_csv_chunked(str(csv_path))
+
+    snapshot.compile_snapshot(str(csv_path))
+    df, state_index, version = snapshot.load_snapshot(str(csv_path))
+
+    assert str(df['state'].dtype) == 'category'
+    assert str(df['reviews'].dtype) == 'Int64'
+    pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
+    assert list(state_index.positions('virginia')) == [0]
+    assert len(version) == 16
+
+
+def test_cache_prefers_fresh_snapshot_and_falls_back_to_csv(tmp_path):
+    csv_path = tmp_path / "LLC Data.csv"
+    write_csv(csv_path, ["A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x"])
+    snapshot.compile_snapshot(str(csv_path))
+    cache = DatasetCache(paths=[str(csv_path)])
+    assert cache.get().source == 'snapshot'
+
+    # A CSV newer than the snapshot wins
+    write_csv(csv_path, [
+        "A,Virginia,Richmond,1,4.0,1,Lawyer,Office,x",
+        "B,Texas,Austin,2,4.0,1,Lawyer,Office,x",
+    ])
+    meta = snapshot.meta_path_for(str(csv_path))
+    st = os.stat(meta)
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    dataset = cache.get()
+    assert dataset.source == 'csv'
+    assert len(dataset.df) == 2
@@ -0,0 +1,43 @@
+import os
+
+from flask import Flask
+
+import template_cache
+
+
+def make_app():
+    app = Flask(__name__)
+    cache = template_cache.FragmentCache(app)
+    return app, cache
+
+
+def test_cache_tag_renders_once_per_content_key():
+    app, cache = make_app()
+    calls = []
+    template = app.jinja_env.from_string(
+        "{% cache info %}<b>{{ info.name }}</b>{{ count() }}{% endcache %}|{{ info.name }}")
+
+    def render(info):
+        return template.render(info=info, count=lambda: calls.append(1) or len(calls))
+
+    assert render({'name': 'A & B'}) == '<b>A &amp; B</b>1|A &amp; B'
+    assert render({'name': 'A & B'}) == '<b>A &amp; B</b>1|A &amp; B'
+    assert render({'name': 'C'}) == '<b>C</b>2|C'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_compiled_templates_are_loaded_from_bytecode(tmp_path):
+    app, _ = make_app()
+    directory = str(tmp_path / "bytecode")
+    count = template_cache.compile_templates(app, directory)
+    assert count > 0 and len(os.listdir(directory)) == count
+
+    fresh, _ = make_app()
+    assert template_cache.use_bytecode_cache(fresh, directory) is not None
+    assert template_cache.use_bytecode_cache(fresh, str(tmp_path / "missing")) is None
+    env = fresh.jinja_env
+    source, filename, _ = env.loader.get_source(env, 'index.html')
+    assert env.bytecode_cache.get_bucket(env, 'index.html', filename, source).code is not None
+    assert 'Top 10 LLC Services' in fresh.jinja_env.get_template('index.html').render(
+        top_services=[], service_info={}, asset_url=str, inline_critical_css=False,
+        content_version='x')
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from work_pool import PoolSaturated, PoolTimeout, WorkPool
+
+
+def test_concurrent_requests_for_a_key_share_one_computation():
+    pool = WorkPool(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'done'
+
+    first = pool.submit('key', compute)
+    second = pool.submit('key', compute)
+    assert first is second
+    release.set()
+    assert pool.run('key', compute) == 'done'
+    assert len(calls) == 1
+    assert pool.stats()['coalesced'] >= 1
+
+
+def test_saturated_pool_rejects_new_work():
+    pool = WorkPool(max_workers=1, max_pending=1)
+    release = threading.Event()
+    pool.submit('a', lambda: release.wait(5))
+    pool.submit('b', lambda: release.wait(5))
+    with pytest.raises(PoolSaturated):
+        pool.submit('c', lambda: None)
+    # Work already in flight is still joinable
+    pool.submit('a', lambda: None)
+    release.set()
+    assert pool.stats()['rejected'] == 1
+
+
+def test_slow_work_times_out_but_keeps_running():
+    pool = WorkPool(max_workers=1)
+    release = threading.Event()
+    with pytest.raises(PoolTimeout):
+        pool.run('slow', lambda: release.wait(5) and 'late', timeout=0.01)
+    release.set()
+    assert pool.run('slow', lambda: 'fresh') in ('late', 'fresh')
+
+
+def test_nested_work_runs_inline():
+    pool = WorkPool(max_workers=1)
+    outer = pool.run('outer', lambda: (threading.current_thread().name,
+                                       pool.run('inner', lambda: threading.current_thread().name)))
+    assert outer[0] == outer[1]
+    assert outer[0].startswith('data-work')
+    assert WorkPool(max_workers=0).run('key', lambda: 42) == 42
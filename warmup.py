@@ -0,0 +1,148 @@
+"""
+Cache warming after the dataset is loaded or reloaded.
+
+``Warmer`` counts successful requests to the data-driven pages. It hooks
+into the DatasetCache (``attach``) so that for every new generation it:
+
+1. builds the indexes returned by ``indexes()`` before the generation is
+   served (``DatasetCache.prepare``). The first listing or city request
+   after a reload therefore finds them ready;
+2. once the generation is live, renders the ``top_n`` most requested
+   pages into the page cache. Before any hits are recorded the pages come
+   from ``fallback(dataset)``: the service pages and then the states
+   ranked by ``/api/states`` counts.
+
+The first load of a process is not warmed unless ``WARM_FIRST_LOAD=1``:
+there the old generation is not around to answer while warming runs, so
+it would only compete with the first requests. Set it for long-running
+servers that preload their data.
+
+The old generation keeps answering while step 1 runs. During step 2 the
+page cache serves each page's previous rendering until it is re-rendered
+(see PageCache ``refresh``), so a reload never shows up as a latency
+spike.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import request
+
+from work_pool import PoolBusy
+
+# Pages rendered after each reload (0 disables page warming); off by default
+# on Vercel, where instances are short-lived
+WARM_PAGES = int(os.environ.get('WARM_PAGES', '0' if os.environ.get('VERCEL') else '50'))
+
+# Also warm the first load of a process (in the background)
+WARM_FIRST_LOAD = os.environ.get('WARM_FIRST_LOAD') == '1'
+
+
+# Distinct page URLs whose hits are counted
+MAX_TRACKED_PAGES = 10000
+
+
+class Warmer:
+    """Hit counts for the data pages, and the warm-up run after each load"""
+
+    def __init__(self, app=None, page_cache=None, endpoints=(), indexes=None,
+                 fallback=None, top_n=WARM_PAGES, first_load=WARM_FIRST_LOAD):
+        self.app = app
+        self.page_cache = page_cache
+        self.endpoints = set(endpoints)
+        # indexes() -> [(name, builder)] built with Dataset.derived
+        self.indexes = indexes or (lambda: [])
+        # fallback(dataset) -> [url] warmed when there are not enough hits
+        self.fallback = fallback or (lambda dataset: [])
+        self.top_n = top_n
+        self.first_load = first_load
+        self.hits = Counter()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.pages_warmed = 0
+        self.last_seconds = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.after_request(self._record)
+
+    def attach(self, dataset_cache):
+        """Run this warmer for every generation ``dataset_cache`` loads"""
+        dataset_cache.prepare = self.prepare
+        dataset_cache.published = self.warm_pages
+        dataset_cache.warm_first_load = self.first_load
+
+    def _record(self, response):
+        if response.status_code == 200 and request.endpoint in self.endpoints:
+            with self._lock:
+                self.hits[request.path] += 1
+                if len(self.hits) > MAX_TRACKED_PAGES:
+                    self.hits = Counter(dict(self.hits.most_common(MAX_TRACKED_PAGES // 2)))
+        return response
+
+    def prepare(self, dataset):
+        """Build the configured indexes on ``dataset`` before it is served"""
+        indexes = self.indexes()
+        # Whole-dataset indexes would read every partition; skip them there
+        if not indexes or getattr(dataset, 'source', None) == 'partitions' or dataset.empty:
+            return
+        started = time.perf_counter()
+        for name, builder in indexes:
+            dataset.derived(name, builder)
+        print(f"Warmed indexes for dataset {dataset.version} "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def top_pages(self, dataset):
+        """The ``top_n`` most requested page URLs, topped up from ``fallback``"""
+        with self._lock:
+            urls = [url for url, _ in self.hits.most_common(self.top_n)]
+        if len(urls) < self.top_n:
+            seen = set(urls)
+            with self.app.test_request_context():
+                fallback = self.fallback(dataset)
+            for url in fallback:
+                if len(urls) >= self.top_n:
+                    break
+                if url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+        return urls
+
+    def warm_pages(self, dataset):
+        """Render the top pages for the live generation into the page cache"""
+        if self.top_n <= 0 or dataset.empty:
+            return 0
+        started = time.perf_counter()
+        warmed = 0
+        urls = self.top_pages(dataset)
+        with self.page_cache.fresh_only():
+            for url in urls:
+                with self.app.test_request_context(url):
+                    try:
+                        self.app.view_functions[request.endpoint](**request.view_args)
+                        warmed += 1
+                    except PoolBusy:
+                        # Real traffic has the pool busy: leave the rest to it
+                        break
+                    except Exception as e:
+                        print(f"Warming {url} failed: {e}")
+        with self._lock:
+            self.runs += 1
+            self.pages_warmed += warmed
+            self.last_seconds = round(time.perf_counter() - started, 3)
+        print(f"Warmed {warmed} pages in {self.last_seconds:.2f}s")
+        return warmed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked_pages': len(self.hits),
+                'top_n': self.top_n,
+                'runs': self.runs,
+                'pages_warmed': self.pages_warmed,
+                'last_seconds': self.last_seconds,
+            }
@@ -0,0 +1,106 @@
+"""
+Bounded background pool for heavy data work.
+
+Dataset loads, index builds, page renders on a cache miss, and listing and
+search queries run on a small thread pool. The request thread does not
+run them inline. This gives three things:
+
+- **Bounded concurrency.** At most ``max_workers`` heavy computations run
+  at once, so a burst of expensive requests cannot starve the cheap
+  static pages of CPU.
+- **Coalescing.** Concurrent requests for the same key share one
+  computation instead of each redoing it.
+- **Admission control.** Once ``max_workers + max_pending`` computations
+  are in flight, new ones are refused at once with ``PoolSaturated``.
+  The app turns that into a 503 with ``Retry-After``. A request that
+  waits longer than ``timeout`` gets ``PoolTimeout``. Its computation
+  still finishes and fills the caches for the retry.
+
+Work submitted from a pool thread runs inline, so nested offloads cannot
+deadlock the pool. With ``max_workers=0`` everything runs inline.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+_local = threading.local()
+
+
+class PoolBusy(Exception):
+    """The pool could not produce a result in time; retry later"""
+
+
+class PoolSaturated(PoolBusy):
+    """Too much work is already queued"""
+
+
+class PoolTimeout(PoolBusy):
+    """The computation did not finish within the request's timeout"""
+
+
+def _mark_pool_thread():
+    _local.in_pool = True
+
+
+class WorkPool:
+    """Thread pool with per-key coalescing and a cap on queued work"""
+
+    def __init__(self, max_workers=2, max_pending=16, timeout=10.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        if max_workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='data-work',
+                                                initializer=_mark_pool_thread)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def submit(self, key, func):
+        """Return the future computing ``key``, starting ``func`` if none is in flight"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            if len(self._inflight) >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated("server busy, retry shortly")
+            future = self._executor.submit(func)
+            self._inflight[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def run(self, key, func, timeout=None):
+        """Compute ``func()`` on the pool (coalesced by ``key``) and wait for it"""
+        if self._executor is None or getattr(_local, 'in_pool', False):
+            return func()
+        future = self.submit(key, func)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout("request timed out waiting for data, retry shortly")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': len(self._inflight),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+            }